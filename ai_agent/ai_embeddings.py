@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+import json
+import os
+import hashlib
+from typing import List, Dict, Any
+import numpy as np
+from openai import OpenAI, AsyncOpenAI
+from dotenv import load_dotenv
+from ai_profiling import stage
+
+load_dotenv()
+
+API_KEY = os.getenv("DASHSCOPE_API_KEY")
+
+if not API_KEY:
+    raise ValueError("DASHSCOPE_API_KEY not found in environment variables")
+
+client = OpenAI(
+    api_key=API_KEY,
+    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+)
+
+async_client = AsyncOpenAI(
+    api_key=API_KEY,
+    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+)
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-v3")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "512"))
+EMBEDDING_BATCH_SIZE = 10  # DashScope accepts at most 10 inputs per request
+
+
+def task_to_text(task: Dict[str, Any]) -> str:
+    """Text used to embed a task (title, description and tags)"""
+    parts = [task.get("title") or ""]
+    if task.get("description"):
+        parts.append(task["description"])
+    tags = task.get("tags") or []
+    if tags:
+        parts.append("Tags: " + ", ".join(str(tag) for tag in tags))
+    return "\n".join(parts)
+
+
+def task_fingerprint(task: Dict[str, Any]) -> str:
+    """Stable hash of the embedded text, used to detect edited tasks"""
+    return hashlib.sha1(task_to_text(task).encode("utf-8")).hexdigest()
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows so dot products are cosine similarities"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _batches(texts: List[str]) -> List[List[str]]:
+    return [
+        [text if text.strip() else " " for text in texts[start:start + EMBEDDING_BATCH_SIZE]]
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE)
+    ]
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """Embed texts in batches, returning a normalized (len(texts), dim) float32 matrix"""
+    if not texts:
+        return np.zeros((0, EMBEDDING_DIMENSIONS), dtype=np.float32)
+
+    try:
+        vectors = []
+        for batch in _batches(texts):
+            with stage("embed"):
+                response = client.embeddings.create(
+                    model=EMBEDDING_MODEL,
+                    input=batch,
+                    dimensions=EMBEDDING_DIMENSIONS,
+                    encoding_format="float"
+                )
+            # Results may come back out of order; sort by index
+            for item in sorted(response.data, key=lambda d: d.index):
+                vectors.append(item.embedding)
+
+        return normalize(np.array(vectors, dtype=np.float32))
+
+    except Exception as e:
+        raise Exception(f"Embedding failed: {str(e)}")
+
+
+async def embed_texts_async(texts: List[str]) -> np.ndarray:
+    """embed_texts on the async client; cancelling the caller closes the HTTP request"""
+    if not texts:
+        return np.zeros((0, EMBEDDING_DIMENSIONS), dtype=np.float32)
+
+    try:
+        vectors = []
+        for batch in _batches(texts):
+            response = await async_client.embeddings.create(
+                model=EMBEDDING_MODEL,
+                input=batch,
+                dimensions=EMBEDDING_DIMENSIONS,
+                encoding_format="float"
+            )
+            for item in sorted(response.data, key=lambda d: d.index):
+                vectors.append(item.embedding)
+
+        return normalize(np.array(vectors, dtype=np.float32))
+
+    except Exception as e:
+        raise Exception(f"Embedding failed: {str(e)}")
+
+
+def main():
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python ai_embeddings.py <text> [text ...]", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        vectors = embed_texts(sys.argv[1:])
+        print(json.dumps({"count": len(vectors), "dimensions": int(vectors.shape[1])}, indent=2))
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
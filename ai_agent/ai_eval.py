@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""Offline quality vs latency evaluation of AI engines.
+
+record:   python ai_eval.py record <inputs.jsonl> <corpus.jsonl>
+          Calls the LLM for each input line ({"kind": ..., "input": {...}}) and
+          stores its output as the reference, with latency and token usage.
+evaluate: python ai_eval.py evaluate <corpus.jsonl> [report.json] [--online]
+          Replays the corpus through every engine registered for each kind and
+          reports accuracy / precision@k / recall@k, latency and cost per call.
+          A run that raises counts as a miss (every metric 0) and in "errors".
+          Runs offline; --online also evaluates engines that call the embedding API.
+calibrate: python ai_eval.py calibrate <corpus.jsonl> [--bm25]
+          Embeds the recorded find_similar cases and prints the cosine cutoff
+          (SIMILAR_MIN_SCORE) that best reproduces the LLM's picks. Calls the embedding API.
+          --bm25 calibrates BM25_SIMILAR_MIN_SCORE instead, offline.
+
+tests/eval_corpus.jsonl is a small hand-labelled corpus for trying the harness.
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+
+LLM_PRICE_INPUT_PER_1K = float(os.getenv("LLM_PRICE_INPUT_PER_1K", "0.00015"))  # CNY, qwen-flash
+LLM_PRICE_OUTPUT_PER_1K = float(os.getenv("LLM_PRICE_OUTPUT_PER_1K", "0.0015"))
+EVAL_K = 5
+# BM25 similar-task cutoff, as a fraction of the target's score against itself
+# (a duplicate scores ~1.0). Recalibrate with: python ai_eval.py calibrate <corpus> --bm25
+BM25_SIMILAR_MIN_SCORE = float(os.getenv("BM25_SIMILAR_MIN_SCORE", "0.2"))
+
+KINDS = ["parse_task", "suggest_tags", "find_similar", "semantic_search"]
+USAGE_FEATURES = {
+    "parse_task": "parse_task",
+    "suggest_tags": "suggest_tags",
+    "find_similar": "similar_tasks",
+    "semantic_search": "semantic_search",
+}
+
+
+# ---------- Local engines ----------
+
+_WORD_PATTERN = re.compile(r"[一-鿿]|[a-z0-9]+(?:-[a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD_PATTERN.findall((text or "").lower())
+
+
+def _task_text(task: Dict[str, Any]) -> str:
+    return " ".join([task.get("title") or "", task.get("description") or "", " ".join(task.get("tags") or [])])
+
+
+class BM25:
+    def __init__(self, documents: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.documents = [Counter(doc) for doc in documents]
+        self.lengths = [len(doc) for doc in documents]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        df = Counter(term for doc in self.documents for term in doc)
+        n = len(documents)
+        self.idf = {term: math.log(1 + (n - freq + 0.5) / (freq + 0.5)) for term, freq in df.items()}
+
+    def scores(self, query: List[str]) -> List[float]:
+        results = []
+        for doc, length in zip(self.documents, self.lengths):
+            score = 0.0
+            for term in query:
+                tf = doc.get(term, 0)
+                if tf:
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+                    score += self.idf[term] * tf * (self.k1 + 1) / norm
+            results.append(score)
+        return results
+
+
+def _bm25_rank(query: str, tasks: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    candidates = [task for task in tasks if task.get("id") is not None]
+    if not candidates:
+        return []
+    scores = BM25([tokenize(_task_text(task)) for task in candidates]).scores(tokenize(query))
+    top = max(scores) or 1.0
+    ranked = sorted(zip(candidates, scores), key=lambda pair: pair[1], reverse=True)
+    return [
+        {"task_id": int(task["id"]), "score": round(score / top, 2)}
+        for task, score in ranked[:limit]
+        if score > 0
+    ]
+
+
+def bm25_search(inp: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return _bm25_rank(inp["query"], inp["tasks"], limit=len(inp["tasks"]))
+
+
+def bm25_similar_scores(target: Dict[str, Any], tasks: List[Dict[str, Any]]) -> List[tuple]:
+    """(task, score) best first, scored relative to the target's own BM25 score.
+
+    Unlike dividing by the best candidate, this keeps a weak best match weak,
+    so one cutoff means the same thing for every target.
+    """
+    candidates = [task for task in tasks if task.get("id") is not None and task.get("id") != target.get("id")]
+    if not candidates:
+        return []
+    query = tokenize(_task_text(target))
+    # The target joins the collection so its self-score uses the same statistics
+    scores = BM25([tokenize(_task_text(task)) for task in candidates] + [query]).scores(query)
+    self_score = scores[-1] or 1.0
+    ranked = [(task, score / self_score) for task, score in zip(candidates, scores)]
+    return sorted(ranked, key=lambda pair: pair[1], reverse=True)
+
+
+def bm25_similar(inp: Dict[str, Any]) -> List[Dict[str, Any]]:
+    ranked = bm25_similar_scores(inp["target_task"], inp["all_tasks"])
+    return [
+        {"task_id": int(task["id"]), "score": round(score, 2)}
+        for task, score in ranked[:EVAL_K]
+        if score >= BM25_SIMILAR_MIN_SCORE
+    ]
+
+
+def embedding_search(inp: Dict[str, Any]) -> List[Dict[str, Any]]:
+    from ai_semantic_search import batch_semantic_search
+    return batch_semantic_search([inp["query"]], inp["tasks"], top_k=len(inp["tasks"]))[0]
+
+
+def embedding_similar(inp: Dict[str, Any]) -> List[Dict[str, Any]]:
+    from ai_task_index import task_index
+    task_index.sync(inp["all_tasks"] + [inp["target_task"]])
+    candidate_ids = {t.get("id") for t in inp["all_tasks"]}
+    return task_index.similar(int(inp["target_task"]["id"]), candidate_ids) or []
+
+
+def keyword_tags(inp: Dict[str, Any]) -> List[str]:
+    """Existing tags mentioned in the task, topped up with its most frequent words"""
+    text = f"{inp.get('title') or ''} {inp.get('description') or ''}".lower()
+    tags = [tag.lower() for tag in inp.get("existing_tags") or [] if tag and tag.lower() in text]
+    for word, _ in Counter(w for w in tokenize(text) if len(w) > 2).most_common():
+        if len(tags) >= 3:
+            break
+        if word not in tags:
+            tags.append(word)
+    return tags[:6]
+
+
+_PRIORITY_RULES = [
+    ("HIGH", re.compile(r"高优先级|紧急|urgent|asap|high priority|critical", re.I)),
+    ("LOW", re.compile(r"低优先级|不急|low priority|someday", re.I)),
+]
+_DAY_OFFSETS = [("后天", 2), ("明天", 1), ("tomorrow", 1), ("今天", 0), ("today", 0)]
+
+
+def rule_parse_task(inp: Dict[str, Any], today: Optional[datetime] = None) -> Dict[str, Any]:
+    """Relative dates resolve against today (the recording date when evaluating a corpus)"""
+    text = inp["input"].strip()
+    today = today or datetime.now()
+
+    priority = "MEDIUM"
+    for level, pattern in _PRIORITY_RULES:
+        if pattern.search(text):
+            priority = level
+            break
+
+    due_at = None
+    for word, offset in _DAY_OFFSETS:
+        if word in text.lower():
+            due_at = (today + timedelta(days=offset)).strftime("%Y-%m-%dT23:59:00")
+            break
+
+    title = re.sub(r"^(高优先级|低优先级|紧急|urgent)[:：]?\s*", "", text, flags=re.I)
+    return {"title": title, "description": None, "due_at": due_at, "priority": priority}
+
+
+def _replay(record: Dict[str, Any]) -> Any:
+    return record["reference"]
+
+
+# kind -> engine name -> (runner, needs_network)
+ENGINES: Dict[str, Dict[str, tuple]] = {
+    "parse_task": {"rules": (rule_parse_task, False)},
+    "suggest_tags": {"keyword": (keyword_tags, False)},
+    "find_similar": {"bm25": (bm25_similar, False), "embedding": (embedding_similar, True)},
+    "semantic_search": {"bm25": (bm25_search, False), "embedding": (embedding_search, True)},
+}
+
+
+# ---------- Metrics ----------
+
+def _ids(items: List[Any]) -> List[Any]:
+    return [item["task_id"] if isinstance(item, dict) else item for item in items]
+
+
+def precision_recall_at_k(predicted: List[Any], reference: List[Any], k: int = EVAL_K):
+    predicted, reference = _ids(predicted)[:k], _ids(reference)[:k]
+    hits = len(set(predicted) & set(reference))
+    precision = hits / len(predicted) if predicted else (1.0 if not reference else 0.0)
+    recall = hits / len(reference) if reference else 1.0
+    return precision, recall
+
+
+def parse_accuracy(predicted: Dict[str, Any], reference: Dict[str, Any]) -> float:
+    """Fraction of title / priority / due minute that match the reference"""
+    def norm_title(value):
+        return (value or "").strip().lower()
+
+    def norm_due(value):
+        return (value or "")[:16]
+
+    checks = [
+        norm_title(predicted.get("title")) == norm_title(reference.get("title")),
+        predicted.get("priority") == reference.get("priority"),
+        norm_due(predicted.get("due_at")) == norm_due(reference.get("due_at")),
+    ]
+    return sum(checks) / len(checks)
+
+
+def score(kind: str, predicted: Any, reference: Any) -> Dict[str, float]:
+    """Metrics for one case; predicted=None (the engine raised) scores 0 on every metric"""
+    if predicted is None:
+        if kind == "parse_task":
+            return {"accuracy": 0.0, "exact": 0.0}
+        return {f"precision@{EVAL_K}": 0.0, f"recall@{EVAL_K}": 0.0}
+    if kind == "parse_task":
+        accuracy = parse_accuracy(predicted, reference)
+        return {"accuracy": accuracy, "exact": float(accuracy == 1.0)}
+    precision, recall = precision_recall_at_k(predicted, reference)
+    return {f"precision@{EVAL_K}": precision, f"recall@{EVAL_K}": recall}
+
+
+def llm_cost(usage: Dict[str, int]) -> float:
+    uncached = usage.get("prompt_tokens", 0) - usage.get("cached_tokens", 0)
+    return (uncached * LLM_PRICE_INPUT_PER_1K + usage.get("completion_tokens", 0) * LLM_PRICE_OUTPUT_PER_1K) / 1000
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * pct), len(values) - 1)] if values else 0.0
+
+
+# ---------- Record / evaluate ----------
+
+def _call_llm(kind: str, inp: Dict[str, Any]) -> Any:
+    if kind == "parse_task":
+        from ai_new_task import parse_task_with_ai
+        return parse_task_with_ai(inp["input"])
+    if kind == "suggest_tags":
+        from ai_tag_suggest import suggest_tags_with_ai
+        existing = inp.get("existing_tags")
+        fetch_tags = (lambda: existing) if existing is not None else None
+        return suggest_tags_with_ai(inp["title"], inp.get("description"), fetch_tags=fetch_tags)
+    if kind == "find_similar":
+        from ai_similar_tasks import find_similar_tasks
+        return find_similar_tasks(inp["target_task"], inp["all_tasks"])
+    from ai_semantic_search import semantic_search
+    return semantic_search(inp["query"], inp["tasks"])
+
+
+def record(inputs_path: str, corpus_path: str) -> None:
+    from ai_prompt_cache import prompt_token_stats
+
+    with open(inputs_path, encoding="utf-8") as f_in, open(corpus_path, "w", encoding="utf-8") as f_out:
+        for line in f_in:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            kind, inp = item["kind"], item["input"]
+            if kind == "suggest_tags" and "existing_tags" not in inp:
+                from ai_tag_suggest import fetch_existing_tags
+                inp["existing_tags"] = fetch_existing_tags()
+
+            # Relative dates ("明天", "today") in the reference resolve against this day
+            today = datetime.now().strftime("%Y-%m-%d")
+            feature = USAGE_FEATURES[kind]
+            before = prompt_token_stats.snapshot().get(feature, {})
+            start = time.perf_counter()
+            reference = _call_llm(kind, inp)
+            latency_ms = (time.perf_counter() - start) * 1000
+            after = prompt_token_stats.snapshot().get(feature, {})
+            usage = {key: after.get(key, 0) - before.get(key, 0)
+                     for key in ("prompt_tokens", "cached_tokens", "completion_tokens", "calls_without_usage")}
+            # Closed before the usage chunk (stopped at a result limit): cost unknown
+            usage_unknown = usage.pop("calls_without_usage") > 0
+
+            f_out.write(json.dumps({
+                "kind": kind, "input": inp, "reference": reference, "today": today,
+                "latency_ms": round(latency_ms, 1), "usage": usage, "usage_unknown": usage_unknown
+            }, ensure_ascii=False) + "\n")
+            print(f"Recorded {kind}: {latency_ms:.0f} ms", file=sys.stderr)
+
+
+def _run_engine(kind: str, runner, rec: Dict[str, Any]) -> Any:
+    if kind == "parse_task" and rec.get("today"):
+        return runner(rec["input"], datetime.strptime(rec["today"], "%Y-%m-%d"))
+    return runner(rec["input"])
+
+
+def evaluate(records: List[Dict[str, Any]], online: bool = False) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Per kind, per engine: mean metrics, latency percentiles and cost per call"""
+    report = {}
+    for kind in KINDS:
+        kind_records = [r for r in records if r["kind"] == kind]
+        if not kind_records:
+            continue
+
+        engines: Dict[str, tuple] = {"llm (recorded)": (None, False)}
+        engines.update({name: spec for name, spec in ENGINES[kind].items() if online or not spec[1]})
+
+        report[kind] = {}
+        for name, (runner, _) in engines.items():
+            metrics: Dict[str, List[float]] = {}
+            latencies, costs, errors = [], [], 0
+            for rec in kind_records:
+                if runner is None:
+                    predicted = _replay(rec)
+                    latencies.append(rec.get("latency_ms", 0.0))
+                    if not rec.get("usage_unknown"):
+                        costs.append(llm_cost(rec.get("usage", {})))
+                else:
+                    start = time.perf_counter()
+                    try:
+                        predicted = _run_engine(kind, runner, rec)
+                    except Exception:
+                        predicted = None
+                        errors += 1
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    costs.append(0.0)
+                for metric, value in score(kind, predicted, rec["reference"]).items():
+                    metrics.setdefault(metric, []).append(value)
+
+            summary = {metric: round(sum(v) / len(v), 3) for metric, v in metrics.items()}
+            summary.update({
+                "calls": len(kind_records),
+                "errors": errors,
+                "p50_ms": round(_percentile(latencies, 0.5), 2),
+                "p95_ms": round(_percentile(latencies, 0.95), 2),
+                "cost_per_call": round(sum(costs) / len(costs), 6) if costs else 0.0,
+            })
+            report[kind][name] = summary
+    return report
+
+
+def _embedding_similar_scores(target: Dict[str, Any], tasks: List[Dict[str, Any]]) -> List[tuple]:
+    """(task, cosine score) best first"""
+    from ai_embeddings import embed_texts, task_to_text
+
+    others = [t for t in tasks if t.get("id") is not None and t.get("id") != target.get("id")]
+    if not others:
+        return []
+    vectors = embed_texts([task_to_text(target)] + [task_to_text(t) for t in others])
+    return sorted(zip(others, (vectors[1:] @ vectors[0]).tolist()), key=lambda pair: pair[1], reverse=True)
+
+
+def calibrate_similar_threshold(records: List[Dict[str, Any]], k: int = EVAL_K,
+                                engine: str = "embedding") -> Dict[str, float]:
+    """Cutoff that maximises mean F1 against the recorded LLM picks.
+
+    engine="embedding" calibrates the task index's cosine cutoff (calls the API);
+    engine="bm25" calibrates BM25_SIMILAR_MIN_SCORE offline.
+    """
+    scorer = bm25_similar_scores if engine == "bm25" else _embedding_similar_scores
+
+    cases = []  # (scores best first, whether each is an LLM pick, number of LLM picks)
+    for rec in records:
+        if rec["kind"] != "find_similar":
+            continue
+        ranked = scorer(rec["input"]["target_task"], rec["input"]["all_tasks"])
+        if not ranked:
+            continue
+        reference = set(_ids(rec["reference"]))
+        cases.append(([s for _, s in ranked[:k]], [t["id"] in reference for t, _ in ranked[:k]], len(reference)))
+
+    if not cases:
+        raise ValueError("Corpus has no find_similar records")
+
+    best = {"threshold": 0.0, "f1": -1.0, "precision": 0.0, "recall": 0.0}
+    for step in range(100):
+        threshold = step / 100
+        precisions, recalls, f1s = [], [], []
+        for scores, picks, relevant in cases:
+            predicted = [pick for s, pick in zip(scores, picks) if s >= threshold]
+            hits = sum(predicted)
+            precision = hits / len(predicted) if predicted else float(relevant == 0)
+            recall = hits / relevant if relevant else 1.0
+            precisions.append(precision)
+            recalls.append(recall)
+            f1s.append(2 * precision * recall / (precision + recall) if precision + recall else 0.0)
+        f1 = sum(f1s) / len(f1s)
+        if f1 > best["f1"]:
+            best = {"threshold": threshold, "f1": round(f1, 3),
+                    "precision": round(sum(precisions) / len(precisions), 3),
+                    "recall": round(sum(recalls) / len(recalls), 3)}
+    best["cases"] = len(cases)
+    return best
+
+
+def format_report(report: Dict[str, Dict[str, Dict[str, float]]]) -> str:
+    lines = []
+    for kind, engines in report.items():
+        metric_names = [m for m in next(iter(engines.values())) if m not in
+                        ("calls", "errors", "p50_ms", "p95_ms", "cost_per_call")]
+        lines.append(f"\n== {kind} ({next(iter(engines.values()))['calls']} cases) ==")
+        header = f"{'engine':<18}" + "".join(f"{m:>14}" for m in metric_names)
+        lines.append(header + f"{'p50 ms':>10}{'p95 ms':>10}{'cost/call':>12}{'errors':>8}")
+        for name, stats in engines.items():
+            row = f"{name:<18}" + "".join(f"{stats.get(m, 0.0):>14.3f}" for m in metric_names)
+            lines.append(row + f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+                         f"{stats['cost_per_call']:>12.6f}{stats['errors']:>8}")
+    return "\n".join(lines)
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if len(args) < 2 or args[0] not in ("record", "evaluate", "calibrate") or (args[0] == "record" and len(args) < 3):
+        print(__doc__, file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        if args[0] == "record":
+            record(args[1], args[2])
+            return
+
+        with open(args[1], encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        if args[0] == "calibrate":
+            engine = "bm25" if "--bm25" in sys.argv else "embedding"
+            print(json.dumps(calibrate_similar_threshold(records, engine=engine), indent=2))
+            return
+        report = evaluate(records, online="--online" in sys.argv)
+        print(format_report(report))
+        if len(args) > 2:
+            with open(args[2], "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+import os
+import time
+import uuid
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from dotenv import load_dotenv
+from ai_summary import generate_summary
+from ai_semantic_search import batch_semantic_search
+from ai_tenants import Tenant, tenant_registry
+
+load_dotenv()
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))  # Jobs running at once
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "100"))  # Queued + running jobs accepted
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))  # Seconds finished jobs are kept
+
+SYNC_BATCH_SIZE = 50  # Tasks indexed between progress updates
+
+
+class Job:
+    """A long-running AI operation and its progress"""
+
+    TERMINAL = ("succeeded", "failed")
+
+    def __init__(self, job_type: str, payload: Dict[str, Any], tenant: Tenant):
+        self.id = uuid.uuid4().hex
+        self.type = job_type
+        self.payload = payload
+        self.tenant = tenant
+        self.status = "queued"
+        self.progress = 0.0
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.done = threading.Event()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+        self._waiters_lock = threading.Lock()
+
+    def set_progress(self, completed: float, total: float) -> None:
+        self.progress = round(completed / total, 3) if total else 1.0
+
+    async def wait(self, timeout: float) -> None:
+        """Wait up to timeout seconds for the job to finish, without holding a thread"""
+        event = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), event)
+        with self._waiters_lock:
+            if self.done.is_set():
+                return
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._waiters_lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def finish(self) -> None:
+        """Mark the job finished and wake every waiter (called from the worker thread)"""
+        self.finished_at = time.time()
+        with self._waiters_lock:
+            self.done.set()
+            waiters, self._waiters = self._waiters, []
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # The waiting loop has closed
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "type": self.type,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """Runs jobs on a bounded worker pool and keeps finished results for a TTL"""
+
+    def __init__(self, workers: int = JOB_WORKERS, max_pending: int = JOB_MAX_PENDING,
+                 ttl: float = JOB_RESULT_TTL):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._handlers: Dict[str, Callable[[Dict[str, Any], Job], Any]] = {}
+        self._validators: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ai-job")
+
+    def register(self, job_type: str, handler: Callable[[Dict[str, Any], Job], Any],
+                 validate: Optional[Callable[[Dict[str, Any]], None]] = None) -> None:
+        """validate(payload) raises ValueError for payloads the handler can't run"""
+        self._handlers[job_type] = handler
+        if validate is not None:
+            self._validators[job_type] = validate
+
+    @property
+    def job_types(self) -> List[str]:
+        return sorted(self._handlers)
+
+    def submit(self, job_type: str, payload: Dict[str, Any], tenant: Optional[Tenant] = None) -> Job:
+        """Queue a job; raises ValueError for unknown types or invalid payloads,
+        RuntimeError when too many jobs are pending"""
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type: {job_type} (expected one of {', '.join(self.job_types)})")
+        if job_type in self._validators:
+            self._validators[job_type](payload)
+
+        with self._lock:
+            self._purge_expired()
+            pending = sum(1 for job in self._jobs.values() if job.status not in Job.TERMINAL)
+            if pending >= self.max_pending:
+                raise RuntimeError("Too many pending jobs, try again later")
+
+            job = Job(job_type, payload, tenant or tenant_registry.get())
+            self._jobs[job.id] = job
+
+        self._pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str, tenant: Optional[Tenant] = None) -> Optional[Job]:
+        """Job by id; with a tenant, other tenants' jobs are not visible"""
+        with self._lock:
+            self._purge_expired()
+            job = self._jobs.get(job_id)
+        if job is not None and tenant is not None and job.tenant.id != tenant.id:
+            return None
+        return job
+
+    def _run(self, job: Job) -> None:
+        job.status = "running"
+        try:
+            job.result = self._handlers[job.type](job.payload, job)
+            job.progress = 1.0
+            job.status = "succeeded"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finish()
+
+    def _purge_expired(self) -> None:
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at > self.ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+def _sync_with_progress(tasks: List[Dict[str, Any]], job: Job, share: float) -> None:
+    """Index tasks into the job tenant's index in batches, reporting progress up to the given share"""
+    for start in range(0, len(tasks), SYNC_BATCH_SIZE):
+        job.tenant.index.sync(tasks[start:start + SYNC_BATCH_SIZE])
+        job.set_progress(share * min(start + SYNC_BATCH_SIZE, len(tasks)), len(tasks))
+    tenant_registry.rebalance(job.tenant)
+
+
+def _search_queries(payload: Dict[str, Any]) -> List[str]:
+    """"query" and "queries" together, stripped, blanks dropped"""
+    queries = [payload.get("query")] + list(payload.get("queries") or [])
+    return [q.strip() for q in queries if q and q.strip()]
+
+
+def validate_tasks(payload: Dict[str, Any]) -> None:
+    tasks = payload.get("tasks", [])
+    if not isinstance(tasks, list) or not all(isinstance(task, dict) for task in tasks):
+        raise ValueError("tasks must be a list of objects")
+    try:
+        [int(task["id"]) for task in tasks if task.get("id") is not None]
+    except (TypeError, ValueError):
+        raise ValueError("task ids must be integers")
+
+
+def validate_summary(payload: Dict[str, Any]) -> None:
+    if payload.get("period", "daily") not in ["daily", "weekly"]:
+        raise ValueError("Period must be 'daily' or 'weekly'")
+    validate_tasks(payload)
+
+
+def validate_search(payload: Dict[str, Any]) -> None:
+    validate_tasks(payload)
+    query, queries = payload.get("query"), payload.get("queries", [])
+    if query is not None and not isinstance(query, str):
+        raise ValueError("query must be a string")
+    if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+        raise ValueError("queries must be a list of strings")
+    if not _search_queries(payload):
+        raise ValueError("Queries cannot be empty")
+    top_k = payload.get("top_k", 10)
+    if not isinstance(top_k, int) or isinstance(top_k, bool) or top_k < 1:
+        raise ValueError("top_k must be a positive integer")
+
+
+def run_summary_job(payload: Dict[str, Any], job: Job) -> Dict[str, Any]:
+    summary = generate_summary(payload.get("tasks", []), payload.get("period", "daily"), on_progress=job.set_progress)
+    return {"summary": summary}
+
+
+def run_similarity_job(payload: Dict[str, Any], job: Job) -> Dict[str, Any]:
+    """Similar tasks for every task in the corpus"""
+    tasks = payload.get("tasks", [])
+    _sync_with_progress(tasks, job, 0.9)
+
+    task_ids = [int(task["id"]) for task in tasks if task.get("id") is not None]
+    candidate_ids = set(task_ids)
+    return {
+        "similar_tasks": {
+            str(task_id): job.tenant.index.similar(task_id, candidate_ids) or []
+            for task_id in task_ids
+        }
+    }
+
+
+def run_search_job(payload: Dict[str, Any], job: Job) -> Dict[str, Any]:
+    queries = _search_queries(payload)
+    tasks = payload.get("tasks", [])
+    _sync_with_progress(tasks, job, 0.8)
+    results = batch_semantic_search(queries, tasks, payload.get("top_k", 10), index=job.tenant.index)
+    return {"results": [{"query": q, "results": r} for q, r in zip(queries, results)]}
+
+
+job_manager = JobManager()
+job_manager.register("summary", run_summary_job, validate_summary)
+job_manager.register("similarity", run_similarity_job, validate_tasks)
+job_manager.register("search", run_search_job, validate_search)
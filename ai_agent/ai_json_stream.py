@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+import json
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional
+from ai_prompt_cache import prompt_token_stats
+
+STREAM_OPTIONS = {"include_usage": True}  # Last chunk carries token usage for prompt_token_stats
+
+# Characters that can follow an opening bracket in JSON (after whitespace)
+_JSON_AFTER = {"{": '"}', "[": '{["-0123456789]'}
+
+
+class StreamingJSONParser:
+    """Incremental parser for the JSON value in a model response.
+
+    Text before the value (code fences, a leading sentence) and anything
+    after it closes are ignored. The value starts at the first '{' or '['
+    followed by something JSON allows there, so brackets in prose such as
+    "[ranked]" or "{see below}" are skipped; a candidate that still fails to
+    parse before any item was returned is dropped and the scan resumes
+    after it. With items_key set, every
+    element of that array in the root object (or of a root array) is returned
+    by feed() as soon as it closes, so ranked results can be used before the
+    response ends and complete items survive a truncated response.
+    """
+
+    def __init__(self, items_key: Optional[str] = None):
+        self.items_key = items_key
+        self.items: List[Any] = []
+        self.complete = False
+        self.salvaged = False
+        self._buf = ""
+        self._pos = 0
+        self._value: Any = None
+        self._error: Optional[json.JSONDecodeError] = None
+        self._reset_root()
+
+    @property
+    def text(self) -> str:
+        return self._buf
+
+    def feed(self, text: str) -> List[Any]:
+        """Consume more of the response; returns the items completed by it"""
+        self._buf += text
+        buf = self._buf
+        completed: List[Any] = []
+
+        while self._pos < len(buf) and not self.complete:
+            pos, ch = self._pos, buf[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._close_string(pos, completed)
+            elif self._root is None:
+                if ch in "{[":
+                    starts = self._starts_json(pos)
+                    if starts is None:
+                        break  # Decide once the next character arrives
+                    if starts:
+                        self._root = pos
+                        self._open(ch)
+            elif ch == '"':
+                self._begin_item(pos)
+                self._in_string = True
+                self._string_start = pos
+            elif ch in "{[":
+                self._begin_item(pos)
+                self._open(ch)
+            elif ch in "}]":
+                self._close(pos, completed)
+            elif ch == ",":
+                self._end_scalar(pos, completed)
+                if self._stack == ["{"]:
+                    self._expect_key = True
+            elif ch != ":" and not ch.isspace():
+                self._begin_item(pos)
+            self._pos += 1
+
+        return completed
+
+    def result(self) -> Any:
+        """The parsed value; for a truncated response, the complete items so far.
+
+        Raises json.JSONDecodeError when nothing usable was received.
+        """
+        if self.complete and self._error is None:
+            return self._value
+        if self._items_seen:
+            self.salvaged = True
+            items = list(self.items)
+            return items if self._buf[self._root] == "[" else {self.items_key: items}
+        if self._error is not None:
+            raise self._error
+        raise json.JSONDecodeError("Incomplete JSON in model response", self._buf, len(self._buf))
+
+    def result_items(self) -> List[Any]:
+        """The items_key array from result(), whether the root is that object or the array itself"""
+        result = self.result()
+        if isinstance(result, dict):
+            result = result.get(self.items_key, [])
+        return result if isinstance(result, list) else []
+
+    def _reset_root(self) -> None:
+        self._root: Optional[int] = None
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = False
+        self._key: Optional[str] = None
+        self._items_depth: Optional[int] = None
+        self._items_seen = False
+        self._item_start: Optional[int] = None
+
+    def _starts_json(self, pos: int) -> Optional[bool]:
+        """Whether the bracket at pos opens a JSON value; None until a non-space follows it"""
+        rest = self._buf[pos + 1:].lstrip()
+        if not rest:
+            return None
+        return rest[0] in _JSON_AFTER[self._buf[pos]]
+
+    def _open(self, ch: str) -> None:
+        self._stack.append(ch)
+        depth = len(self._stack)
+        if depth == 1 and ch == "{":
+            self._expect_key = True
+        if ch == "[" and self.items_key is not None and self._items_depth is None and (
+            depth == 1 or (depth == 2 and self._stack[0] == "{" and self._key == self.items_key)
+        ):
+            self._items_depth = depth
+            self._items_seen = True
+
+    def _close(self, pos: int, completed: List[Any]) -> None:
+        if len(self._stack) == self._items_depth:
+            self._end_scalar(pos, completed)
+        self._stack.pop()
+        depth = len(self._stack)
+
+        if self._items_depth is not None:
+            if depth < self._items_depth:
+                self._items_depth = None
+            elif depth == self._items_depth and self._item_start is not None:
+                self._emit(self._buf[self._item_start:pos + 1], completed)
+
+        if not self._stack:
+            try:
+                self._value = json.loads(self._buf[self._root:pos + 1])
+                self._error = None
+            except json.JSONDecodeError as e:
+                self._error = e
+                if not self.items:
+                    # Prose that only looked like JSON; look for the value after it
+                    self._pos = self._root
+                    self._reset_root()
+                    return
+            self.complete = True
+
+    def _close_string(self, pos: int, completed: List[Any]) -> None:
+        raw = self._buf[self._string_start:pos + 1]
+        if self._expect_key and self._stack == ["{"]:
+            self._expect_key = False
+            try:
+                self._key = json.loads(raw)
+            except json.JSONDecodeError:
+                self._key = None
+        elif len(self._stack) == self._items_depth and self._item_start == self._string_start:
+            self._emit(raw, completed)
+
+    def _begin_item(self, pos: int) -> None:
+        if len(self._stack) == self._items_depth and self._item_start is None:
+            self._item_start = pos
+
+    def _end_scalar(self, pos: int, completed: List[Any]) -> None:
+        """Numbers and literals have no closing character; they end at ',' or ']'"""
+        if len(self._stack) == self._items_depth and self._item_start is not None:
+            self._emit(self._buf[self._item_start:pos].strip(), completed)
+
+    def _emit(self, raw: str, completed: List[Any]) -> None:
+        self._item_start = None
+        try:
+            item = json.loads(raw)
+        except json.JSONDecodeError:
+            return  # Malformed element; the rest of the array is still usable
+        self.items.append(item)
+        completed.append(item)
+
+
+def _chunk_text(chunk: Any) -> str:
+    choices = getattr(chunk, "choices", None)
+    if not choices:
+        return ""
+    return choices[0].delta.content or ""
+
+
+def _record_usage(feature: str, chunk: Any) -> bool:
+    """Record the usage chunk; returns whether this was it"""
+    if getattr(chunk, "usage", None) is not None:
+        prompt_token_stats.record(feature, chunk)
+        return True
+    return False
+
+
+def stream_items(stream: Any, parser: StreamingJSONParser, feature: str, limit: Optional[int] = None,
+                 accept: Optional[Callable[[Any], bool]] = None) -> Iterator[Any]:
+    """Feed a streamed chat completion to parser, yielding accepted items as they close.
+
+    Once limit items are accepted the upstream response is closed, so the
+    model stops generating; parser.result() then returns those items. The
+    usage chunk comes last, so a response closed early is counted as a call
+    with unknown usage.
+    """
+    accepted = 0
+    usage_seen = False
+    try:
+        for chunk in stream:
+            usage_seen = _record_usage(feature, chunk) or usage_seen
+            for item in parser.feed(_chunk_text(chunk)):
+                if accept is not None and not accept(item):
+                    continue
+                yield item
+                accepted += 1
+                if limit is not None and accepted >= limit:
+                    return
+    finally:
+        stream.close()
+        if not usage_seen:
+            prompt_token_stats.record_unknown(feature)
+
+
+def read_stream(stream: Any, parser: StreamingJSONParser, feature: str, limit: Optional[int] = None,
+                accept: Optional[Callable[[Any], bool]] = None) -> StreamingJSONParser:
+    """Consume a streamed chat completion (up to limit accepted items) into parser"""
+    for _ in stream_items(stream, parser, feature, limit, accept):
+        pass
+    return parser
+
+
+async def astream_items(stream: Any, parser: StreamingJSONParser, feature: str, limit: Optional[int] = None,
+                        accept: Optional[Callable[[Any], bool]] = None) -> AsyncIterator[Any]:
+    """stream_items for the async client"""
+    accepted = 0
+    usage_seen = False
+    try:
+        async for chunk in stream:
+            usage_seen = _record_usage(feature, chunk) or usage_seen
+            for item in parser.feed(_chunk_text(chunk)):
+                if accept is not None and not accept(item):
+                    continue
+                yield item
+                accepted += 1
+                if limit is not None and accepted >= limit:
+                    return
+    finally:
+        await stream.close()
+        if not usage_seen:
+            prompt_token_stats.record_unknown(feature)
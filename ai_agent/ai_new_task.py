@@ -2,9 +2,11 @@
 import json
 import sys
 import os
-from datetime import datetime, timedelta
+from datetime import datetime
 from openai import OpenAI
 from dotenv import load_dotenv
+from ai_profiling import stage
+from ai_json_stream import StreamingJSONParser, STREAM_OPTIONS, read_stream
 
 load_dotenv()
 
@@ -18,66 +20,74 @@ client = OpenAI(
 )
 
 
-def get_system_prompt():
-    today = datetime.now()
-    return f"""You are an intelligent task parsing assistant.
+# Static prompt, built once at import. Keep it byte-identical across calls so the
+# provider can cache the prefix; per-call values (today's date) go in the user message.
+SYSTEM_PROMPT = """You are an intelligent task parsing assistant.
 
 Your job is to convert a natural language instruction into a structured task object.
 
-Today's date is: {today.strftime('%Y-%m-%d %A')}
-
 Rules:
 - The input may be Chinese, English, or mixed.
 - If information is missing, infer conservatively.
 - Do NOT hallucinate dates or priorities if not implied.
 - Prefer clarity over verbosity.
-- For relative dates like "明天" (tomorrow), "下周" (next week), calculate based on today's date.
+- For relative dates like "明天" (tomorrow), "下周" (next week), calculate based on the "Today's date" given with the input.
 - Time format: ISO 8601 (e.g., 2026-01-05T15:00:00)
 
 Return STRICT JSON ONLY. No explanation, no markdown code blocks, just pure JSON.
 
 JSON schema:
-{{
+{
   "title": string,
   "description": string | null,
   "due_at": string | null,        // ISO 8601, e.g. 2026-01-05T15:00:00
   "priority": "LOW" | "MEDIUM" | "HIGH" | null
-}}
+}
 
-Examples:
+Examples (Today's date is: 2026-01-05 Monday):
 
 Input: 明天下午三点提醒我买菜
-Output: {{"title": "买菜", "description": "提醒买菜", "due_at": "{(today + timedelta(days=1)).strftime('%Y-%m-%d')}T15:00:00", "priority": "MEDIUM"}}
+Output: {"title": "买菜", "description": "提醒买菜", "due_at": "2026-01-06T15:00:00", "priority": "MEDIUM"}
 
 Input: Finish backend pagination
-Output: {{"title": "Finish backend pagination", "description": null, "due_at": null, "priority": "MEDIUM"}}
+Output: {"title": "Finish backend pagination", "description": null, "due_at": null, "priority": "MEDIUM"}
 
 Input: 高优先级：完成季度报告，本周五前
-Output: {{"title": "完成季度报告", "description": "季度报告", "due_at": "<this Friday at 23:59>", "priority": "HIGH"}}
+Output: {"title": "完成季度报告", "description": "季度报告", "due_at": "2026-01-09T23:59:00", "priority": "HIGH"}
 """
 
 
+def get_system_prompt() -> str:
+    return SYSTEM_PROMPT
+
+
+def build_messages(user_input: str, today: datetime = None) -> list:
+    """Static system prompt first, variable parts (date, input) last"""
+    today = today or datetime.now()
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Today's date is: {today.strftime('%Y-%m-%d %A')}\n\nNow parse the following input:\n{user_input}"}
+    ]
+
+
 def parse_task_with_ai(user_input: str) -> dict:
     try:
-        completion = client.chat.completions.create(
-            model="qwen-flash-2025-07-28",
-            messages=[
-                {"role": "system", "content": get_system_prompt()},
-                {"role": "user", "content": f"Now parse the following input:\n{user_input}"}
-            ],
-            temperature=0.3,
-            max_tokens=500
-        )
-        
-        ai_response = completion.choices[0].message.content.strip()
+        with stage("upstream"):
+            completion = client.chat.completions.create(
+                model="qwen-flash-2025-07-28",
+                messages=build_messages(user_input),
+                temperature=0.3,
+                max_tokens=500,
+                stream=True,
+                stream_options=STREAM_OPTIONS
+            )
+            parser = read_stream(completion, StreamingJSONParser(), "parse_task")
         
-        # Extract JSON from markdown code blocks if present
-        if "```json" in ai_response:
-            ai_response = ai_response.split("```json")[1].split("```")[0].strip()
-        elif "```" in ai_response:
-            ai_response = ai_response.split("```")[1].split("```")[0].strip()
+        ai_response = parser.text
         
-        task_obj = json.loads(ai_response)
+        with stage("extract"):
+            # Code fences and surrounding text are skipped by the parser
+            task_obj = parser.result()
         
         if "title" not in task_obj or not task_obj["title"]:
             raise ValueError("Task title is required")
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+import os
+import io
+import time
+import random
+import inspect
+import pstats
+import cProfile
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROFILE_HEADER = "X-Profile"  # Send "X-Profile: 1" to profile a single request
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Fraction of requests profiled
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "2000"))  # Dump cProfile stats above this
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+ROUTE_STAGES = ("validate_request", "serialize_response")  # Recorded around the endpoint, not inside it
+
+_current_profile: contextvars.ContextVar = contextvars.ContextVar("request_profile", default=None)
+
+
+class RequestProfile:
+    """Stage timings and cProfile data collected for one profiled request.
+
+    cProfile only runs in the worker threads doing the request's blocking work
+    (see call_profiled), so concurrent requests on the event loop don't show up
+    in each other's profiles.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.profilers: List[cProfile.Profile] = []
+        self.endpoint_span: Optional[Tuple[float, float]] = None
+        self._lock = threading.Lock()
+
+    def add(self, name: str, duration_ms: float) -> None:
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + duration_ms
+
+    def add_profiler(self, profiler: cProfile.Profile) -> None:
+        with self._lock:
+            self.profilers.append(profiler)
+
+    def add_route(self, start: float, end: float) -> None:
+        """Split a route handler's time around the endpoint call into request
+        parsing/validation and response validation/serialization"""
+        if self.endpoint_span is None:
+            self.add("validate_request", (end - start) * 1000)  # Rejected before the endpoint ran
+            return
+        endpoint_start, endpoint_end = self.endpoint_span
+        self.add("validate_request", (endpoint_start - start) * 1000)
+        self.add("serialize_response", (end - endpoint_end) * 1000)
+
+    def server_timing(self, total_ms: float) -> str:
+        """Server-Timing header value. Endpoint time outside named stages is reported
+        as "handler"; anything else (middleware, routing) as "framework"."""
+        entries = [f"{name};dur={duration:.1f}" for name, duration in self.stages.items()]
+        handler_ms = 0.0
+        if self.endpoint_span is not None:
+            inner_ms = sum(d for name, d in self.stages.items() if name not in ROUTE_STAGES)
+            handler_ms = max((self.endpoint_span[1] - self.endpoint_span[0]) * 1000 - inner_ms, 0.0)
+            entries.append(f"handler;dur={handler_ms:.1f}")
+        framework_ms = max(total_ms - sum(self.stages.values()) - handler_ms, 0.0)
+        entries.append(f"framework;dur={framework_ms:.1f}")
+        entries.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(entries)
+
+
+def should_profile(header_value: Optional[str]) -> bool:
+    if header_value is not None:
+        return header_value.strip().lower() in ("1", "true", "yes")
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def start_profile() -> RequestProfile:
+    """Begin profiling the current request context"""
+    profile = RequestProfile()
+    _current_profile.set(profile)
+    return profile
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current_profile.get()
+
+
+def finish_profile(profile: RequestProfile, total_ms: float, label: str) -> Optional[str]:
+    """Writes timings (and cProfile stats, if any) for slow requests; returns the dump path"""
+    if total_ms < PROFILE_SLOW_MS:
+        return None
+
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        safe_label = "".join(c if c.isalnum() else "_" for c in label).strip("_")
+        path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}_{safe_label}_{int(total_ms)}ms")
+
+        report = io.StringIO()
+        report.write(f"{label}: {total_ms:.1f} ms\n")
+        report.write(f"Server-Timing: {profile.server_timing(total_ms)}\n\n")
+        if profile.profilers:
+            stats = pstats.Stats(*profile.profilers, stream=report)
+            stats.dump_stats(path + ".prof")
+            stats.sort_stats("cumulative").print_stats(40)
+        with open(path + ".txt", "w", encoding="utf-8") as f:
+            f.write(report.getvalue())
+
+        return path + (".prof" if profile.profilers else ".txt")
+    except Exception as e:
+        print(f"Warning: Failed to write profile dump: {str(e)}")
+        return None
+
+
+def call_profiled(func, *args, **kwargs):
+    """func(*args, **kwargs), recorded by cProfile when the current request is profiled.
+
+    Meant for the worker thread running a request's blocking work: cProfile
+    only sees the thread that enables it.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        return func(*args, **kwargs)
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+ allows one active profiler per process; keep stage timings only
+        return func(*args, **kwargs)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        profile.add_profiler(profiler)
+
+
+def mark_endpoint(endpoint):
+    """Wrap an async endpoint to record when it runs, for RequestProfile.add_route"""
+    if not inspect.iscoroutinefunction(endpoint):
+        return endpoint
+
+    @functools.wraps(endpoint)
+    async def marked(*args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return await endpoint(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            profile.endpoint_span = (start, time.perf_counter())
+    return marked
+
+
+@contextmanager
+def stage(name: str):
+    """Time a named stage of the current request; no-op unless the request is profiled"""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, (time.perf_counter() - start) * 1000)
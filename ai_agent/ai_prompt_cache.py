@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+import re
+import json
+import hashlib
+import threading
+from typing import List, Dict, Any, Tuple
+
+# Rough tokenizer: one token per CJK character, word, punctuation mark or whitespace run
+_TOKEN_PATTERN = re.compile(r"[一-鿿]|\w+|[^\w\s]|\s+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text)
+
+
+def messages_to_tokens(messages: List[Dict[str, str]]) -> List[str]:
+    """Flatten chat messages in the order the provider sees them"""
+    tokens = []
+    for message in messages:
+        tokens.append(f"<|{message['role']}|>")
+        tokens.extend(tokenize(message["content"]))
+    return tokens
+
+
+class PrefixCacheMock:
+    """Simulates provider-side prompt prefix caching.
+
+    Like hosted KV caches, a prompt reuses the longest previously seen prefix,
+    counted in whole blocks and only once it reaches min_tokens. Anything after
+    the first changed token is billed as uncached.
+    """
+
+    def __init__(self, block_size: int = 64, min_tokens: int = 256):
+        self.block_size = block_size
+        self.min_tokens = min_tokens
+        self._prefixes = set()
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def request(self, messages: List[Dict[str, str]]) -> Tuple[int, int]:
+        """Send a prompt; returns (prompt_tokens, cached_tokens)"""
+        tokens = messages_to_tokens(messages)
+        digest = hashlib.sha1()
+        cached = 0
+        missed = False
+        for end in range(self.block_size, len(tokens) + 1, self.block_size):
+            digest.update("".join(tokens[end - self.block_size:end]).encode("utf-8"))
+            key = digest.copy().hexdigest()
+            if not missed and key in self._prefixes:
+                cached = end
+            else:
+                missed = True
+                self._prefixes.add(key)
+
+        if cached < self.min_tokens:
+            cached = 0
+
+        self.prompt_tokens += len(tokens)
+        self.cached_tokens += cached
+        return len(tokens), cached
+
+    @property
+    def hit_rate(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+class PromptTokenStats:
+    """Cached vs uncached prompt tokens reported by the provider, per feature"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def record(self, feature: str, completion: Any) -> None:
+        usage = getattr(completion, "usage", None)
+        if usage is None:
+            return
+
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+
+        with self._lock:
+            stats = self._feature(feature)
+            stats["calls"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["cached_tokens"] += cached_tokens
+            stats["completion_tokens"] += completion_tokens
+
+    def record_unknown(self, feature: str) -> None:
+        """A call whose usage never arrived (the stream was closed before its last chunk)"""
+        with self._lock:
+            stats = self._feature(feature)
+            stats["calls"] += 1
+            stats["calls_without_usage"] += 1
+
+    def _feature(self, feature: str) -> Dict[str, int]:
+        return self._stats.setdefault(feature, {"calls": 0, "calls_without_usage": 0, "prompt_tokens": 0,
+                                                "cached_tokens": 0, "completion_tokens": 0})
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                feature: {
+                    **stats,
+                    "uncached_tokens": stats["prompt_tokens"] - stats["cached_tokens"],
+                    "cache_hit_rate": round(stats["cached_tokens"] / stats["prompt_tokens"], 3) if stats["prompt_tokens"] else 0.0
+                }
+                for feature, stats in self._stats.items()
+            }
+
+
+prompt_token_stats = PromptTokenStats()
+
+
+def main():
+    """Replay varying parse/tag prompts through the mock cache, comparing layouts"""
+    import os
+    from datetime import datetime, timedelta
+    os.environ.setdefault("DASHSCOPE_API_KEY", "offline")
+    import ai_new_task
+    import ai_tag_suggest
+
+    inputs = ["明天下午三点提醒我买菜", "Finish backend pagination", "高优先级：完成季度报告，本周五前", "Review PR #42 by Friday"]
+    tag_sets = [["frontend", "backend", "bug"], ["docs", "api"], ["研究", "性能优化", "backend", "urgent"]]
+
+    def variable_first(messages):
+        # Previous layout: per-call values embedded ahead of the static examples
+        system, user = messages
+        variable, _, rest = user["content"].rpartition("\n\n")
+        return [{"role": "system", "content": variable + "\n\n" + system["content"]}, {"role": "user", "content": rest}]
+
+    print(f"{'feature':<14}{'layout':<18}{'prompt':>8}{'cached':>8}{'hit rate':>10}")
+    for feature, calls in [
+        ("parse_task", [ai_new_task.build_messages(text, datetime(2026, 1, 5) + timedelta(days=day))
+                        for day in range(5) for text in inputs]),
+        ("suggest_tags", [ai_tag_suggest.build_messages(text, None, tags) for tags in tag_sets for text in inputs]),
+    ]:
+        for layout, transform in [("static-first", lambda m: m), ("variable-first", variable_first)]:
+            mock = PrefixCacheMock()
+            for messages in calls:
+                mock.request(transform(messages))
+            print(f"{feature:<14}{layout:<18}{mock.prompt_tokens:>8}{mock.cached_tokens:>8}{mock.hit_rate:>10.1%}")
+
+    print(json.dumps({"static_prompt_tokens": {
+        "parse_task": len(tokenize(ai_new_task.SYSTEM_PROMPT)),
+        "suggest_tags": len(tokenize(ai_tag_suggest.SYSTEM_PROMPT)),
+    }}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+import os
+import asyncio
+from typing import List, Dict, Any, Optional, Callable, Awaitable
+from dotenv import load_dotenv
+from ai_embeddings import embed_texts_async
+from ai_task_index import TaskIndex, task_index
+from ai_semantic_search import iter_semantic_search_async, SEARCH_MIN_SCORE
+
+load_dotenv()
+
+SEARCH_DEBOUNCE_MS = int(os.getenv("SEARCH_DEBOUNCE_MS", "250"))  # Quiet time before a query runs
+SEARCH_STREAM_TOP_K = 10  # Results pushed per query; the LLM stops once it has ranked this many
+
+COUNTERS = [
+    "queries",             # Query messages received
+    "debounced",           # Superseded before leaving the debounce window (no upstream cost)
+    "upstream_calls",      # Embedding or LLM calls started
+    "upstream_completed",
+    "upstream_cancelled",  # Started, then superseded or disconnected: wasted
+    "upstream_failed",
+]
+
+
+def _snapshot(counters: Dict[str, int]) -> Dict[str, Any]:
+    calls = counters["upstream_calls"]
+    return {
+        **counters,
+        "wasted_upstream_calls": counters["upstream_cancelled"],
+        "wasted_rate": round(counters["upstream_cancelled"] / calls, 3) if calls else 0.0,
+    }
+
+
+class SearchStreamStats:
+    """Counters across all search-as-you-type connections"""
+
+    def __init__(self):
+        self.connections = 0
+        self.active_connections = 0
+        self.counters = {name: 0 for name in COUNTERS}
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "connections": self.connections,
+            "active_connections": self.active_connections,
+            **_snapshot(self.counters),
+        }
+
+
+search_stream_stats = SearchStreamStats()
+
+
+def _retrieve_exception(future: asyncio.Future) -> None:
+    if not future.cancelled():
+        future.exception()
+
+
+class SearchSession:
+    """One search-as-you-type connection.
+
+    Each query waits out the debounce window, then pushes local index results
+    (one embedding call) followed by the LLM ranking, re-sent as each result
+    streams in. A newer query cancels whatever the previous one is doing:
+    embedding and LLM calls go through the async clients, so their HTTP
+    requests are closed. The local index scan is short and runs to completion
+    in a worker thread; a superseded query's scan result is discarded. Each
+    query keeps the task set it was submitted with, even if the client sends
+    a new one while it runs.
+    """
+
+    def __init__(self, send: Callable[[Dict[str, Any]], Awaitable[None]],
+                 index: TaskIndex = task_index, debounce_ms: int = SEARCH_DEBOUNCE_MS):
+        self._send = send
+        self._index = index
+        self.debounce = debounce_ms / 1000
+        self.counters = {name: 0 for name in COUNTERS}
+        self._tasks: List[Dict[str, Any]] = []
+        self._task_ids: List[int] = []
+        self._sync: Optional[asyncio.Future] = None
+        self._current: Optional[asyncio.Task] = None
+        self._debouncing = False  # Whether the current query is still in its debounce window
+        self._seq = 0
+
+        search_stream_stats.connections += 1
+        search_stream_stats.active_connections += 1
+
+    async def handle(self, message: Dict[str, Any]) -> None:
+        """Dispatch one client message; malformed ones get an error reply"""
+        kind = message.get("type")
+        try:
+            if kind == "tasks":
+                self.set_tasks(message.get("tasks") or [])
+            elif kind == "query":
+                query, seq = message.get("query") or "", message.get("seq")
+                if not isinstance(query, str):
+                    raise ValueError("query must be a string")
+                if seq is not None and (not isinstance(seq, int) or isinstance(seq, bool)):
+                    raise ValueError("seq must be an integer")
+                self.submit(query, seq)
+            elif kind == "stats":
+                await self._push({"type": "stats", **self.snapshot()})
+            else:
+                await self._push({"type": "error", "error": f"Unknown message type: {kind}"})
+        except ValueError as e:
+            await self._push({"type": "error", "error": str(e)})
+
+    def set_tasks(self, tasks: List[Dict[str, Any]]) -> None:
+        """Replace the task set; indexing starts now so the first query finds it ready.
+
+        Raises ValueError unless tasks is a list of objects with integer ids.
+        """
+        if not isinstance(tasks, list) or not all(isinstance(task, dict) for task in tasks):
+            raise ValueError("tasks must be a list of objects")
+        try:
+            task_ids = [int(task["id"]) for task in tasks if task.get("id") is not None]
+        except (TypeError, ValueError):
+            raise ValueError("task ids must be integers")
+
+        self._tasks = tasks
+        self._task_ids = task_ids
+        self._sync = None
+        if tasks:
+            self._sync = asyncio.ensure_future(asyncio.to_thread(self._index.sync, tasks))
+            # A failure is reported to the queries waiting on it; retrieve it here too,
+            # so a sync replaced before any query awaited it doesn't log a warning
+            self._sync.add_done_callback(_retrieve_exception)
+
+    def submit(self, query: str, seq: Optional[int] = None) -> int:
+        """Start a query, superseding the previous one"""
+        self._seq = int(seq) if seq is not None else self._seq + 1
+        self._count("queries")
+        self._cancel_current()
+        query = query.strip()
+        self._debouncing = bool(query and self._tasks)
+        self._current = asyncio.create_task(
+            self._run(query, self._seq, self._tasks, self._task_ids, self._sync)
+        )
+        return self._seq
+
+    def snapshot(self) -> Dict[str, Any]:
+        return _snapshot(self.counters)
+
+    def close(self) -> None:
+        self._cancel_current()
+        search_stream_stats.active_connections -= 1
+
+    def _cancel_current(self) -> None:
+        if self._current is not None and not self._current.done():
+            if self._debouncing:
+                self._count("debounced")
+            self._current.cancel()
+
+    def _count(self, name: str) -> None:
+        self.counters[name] += 1
+        search_stream_stats.counters[name] += 1
+
+    async def _push(self, message: Dict[str, Any]) -> None:
+        try:
+            await self._send(message)
+        except Exception:
+            pass  # Client went away; close() cancels the rest
+
+    async def _run(self, query: str, seq: int, tasks: List[Dict[str, Any]], task_ids: List[int],
+                   sync: Optional[asyncio.Future]) -> None:
+        if not query or not tasks:
+            await self._push({"type": "results", "seq": seq, "query": query, "source": "ai",
+                              "final": True, "results": []})
+            return
+
+        await asyncio.sleep(self.debounce)
+        self._debouncing = False
+
+        index_results = await self._index_results(query, task_ids, sync)
+        if index_results is not None:
+            await self._push({"type": "results", "seq": seq, "query": query, "source": "index",
+                              "final": False, "results": index_results})
+
+        try:
+            results = await self._upstream(self._stream_ai_results(query, seq, tasks))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self._push({"type": "error", "seq": seq, "query": query, "error": str(e)})
+            return
+        await self._push({"type": "results", "seq": seq, "query": query, "source": "ai",
+                          "final": True, "results": results})
+
+    async def _stream_ai_results(self, query: str, seq: int, tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        results: List[Dict[str, Any]] = []
+        async for item in iter_semantic_search_async(query, tasks, top_k=SEARCH_STREAM_TOP_K):
+            results.append(item)
+            results.sort(key=lambda x: x["score"], reverse=True)
+            await self._push({"type": "results", "seq": seq, "query": query, "source": "ai",
+                              "final": False, "results": list(results)})
+        return results
+
+    async def _index_results(self, query: str, task_ids: List[int],
+                             sync: Optional[asyncio.Future]) -> Optional[List[Dict[str, Any]]]:
+        """Embedding ranking from the task index, or None when it isn't available"""
+        if sync is None:
+            return None
+        try:
+            # Shielded: indexing is shared by later queries, only this wait is cancelled
+            await asyncio.shield(sync)
+            query_vectors = await self._upstream(embed_texts_async([query]))
+            results = await asyncio.to_thread(
+                self._index.search, query_vectors, task_ids,
+                top_k=SEARCH_STREAM_TOP_K, min_score=SEARCH_MIN_SCORE,
+            )
+            return results[0]
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Warning: Index search failed, waiting for AI results: {str(e)}")
+            return None
+
+    async def _upstream(self, awaitable: Awaitable[Any]) -> Any:
+        self._count("upstream_calls")
+        try:
+            result = await awaitable
+        except asyncio.CancelledError:
+            self._count("upstream_cancelled")
+            raise
+        except Exception:
+            self._count("upstream_failed")
+            raise
+        self._count("upstream_completed")
+        return result
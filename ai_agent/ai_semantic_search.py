@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 import json
 import os
-from typing import List, Dict, Any
-from openai import OpenAI
+from typing import List, Dict, Any, Optional, AsyncIterator
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
+from ai_embeddings import embed_texts
+from ai_task_index import TaskIndex, task_index
+from ai_profiling import stage
+from ai_json_stream import StreamingJSONParser, STREAM_OPTIONS, read_stream, astream_items
 
 load_dotenv()
 
@@ -17,6 +21,13 @@ client = OpenAI(
     base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
 )
 
+async_client = AsyncOpenAI(
+    api_key=API_KEY,
+    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+)
+
+SEARCH_MIN_SCORE = 0.2  # Same threshold as the LLM search prompt
+
 
 def get_system_prompt() -> str:
     return """You are a semantic search assistant for tasks.
@@ -46,73 +57,92 @@ Output: {"results": [{"task_id": 5, "score": 0.88}]}
 """
 
 
-def semantic_search(query: str, tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Search tasks using semantic similarity"""
-    try:
-        if not query or not tasks:
-            return []
-
-        # Build task list
-        task_list = []
-        for task in tasks:
-            task_info = {
-                "id": task.get("id"),
-                "title": task.get("title", ""),
-                "description": task.get("description", ""),
-                "tags": task.get("tags", [])
-            }
-            task_list.append(task_info)
+def build_user_input(query: str, tasks: List[Dict[str, Any]]) -> str:
+    task_list = []
+    for task in tasks:
+        task_info = {
+            "id": task.get("id"),
+            "title": task.get("title", ""),
+            "description": task.get("description", ""),
+            "tags": task.get("tags", [])
+        }
+        task_list.append(task_info)
 
-        # Build prompt
-        user_input = f"""Query: {query}
+    return f"""Query: {query}
 
 Tasks:
 {json.dumps(task_list, ensure_ascii=False)}"""
 
-        # Call AI
-        completion = client.chat.completions.create(
-            model="qwen-flash-2025-07-28",
-            messages=[
-                {"role": "system", "content": get_system_prompt()},
-                {"role": "user", "content": user_input}
-            ],
-            temperature=0.1,
-            max_tokens=1000
-        )
 
-        ai_response = completion.choices[0].message.content.strip()
+def build_messages(query: str, tasks: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": get_system_prompt()},
+        {"role": "user", "content": build_user_input(query, tasks)}
+    ]
+
+
+def _validate_item(item: Any) -> Optional[Dict[str, Any]]:
+    if isinstance(item, dict) and "task_id" in item and "score" in item:
+        try:
+            score = float(item["score"])
+            task_id = int(item["task_id"])
+        except (TypeError, ValueError, OverflowError):
+            return None
+        if 0.0 <= score <= 1.0 and score >= SEARCH_MIN_SCORE:
+            return {
+                "task_id": task_id,
+                "score": round(score, 2)
+            }
+    return None
+
+
+def validate_results(results: List[Any]) -> List[Dict[str, Any]]:
+    """Keep well-formed items above the score threshold, best first"""
+    valid_results = []
+    for item in results:
+        valid = _validate_item(item)
+        if valid is not None:
+            valid_results.append(valid)
 
-        # Clean markdown
-        if "```json" in ai_response:
-            ai_response = ai_response.split("```json")[1].split("```")[0].strip()
-        elif "```" in ai_response:
-            ai_response = ai_response.split("```")[1].split("```")[0].strip()
+    # Sort by score descending
+    valid_results.sort(key=lambda x: x["score"], reverse=True)
+    return valid_results
 
-        # Extract JSON from response (handle extra text after JSON)
-        import re
-        json_match = re.search(r'\{.*\}', ai_response, re.DOTALL)
-        if json_match:
-            ai_response = json_match.group()
 
-        # Parse JSON
-        result = json.loads(ai_response)
-        results = result.get("results", [])
+def semantic_search(query: str, tasks: List[Dict[str, Any]], top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Search tasks using semantic similarity.
 
-        # Validate and sort
-        valid_results = []
-        for item in results:
-            if isinstance(item, dict) and "task_id" in item and "score" in item:
-                score = float(item["score"])
-                if 0.0 <= score <= 1.0 and score >= 0.2:
-                    valid_results.append({
-                        "task_id": int(item["task_id"]),
-                        "score": round(score, 2)
-                    })
+    The model ranks best first, so with top_k set generation stops as soon
+    as top_k usable results have been streamed.
+    """
+    ai_response = ""
+    try:
+        if not query or not tasks:
+            return []
 
-        # Sort by score descending
-        valid_results.sort(key=lambda x: x["score"], reverse=True)
+        with stage("prompt"):
+            messages = build_messages(query, tasks)
 
-        return valid_results
+        # Call AI
+        with stage("upstream"):
+            completion = client.chat.completions.create(
+                model="qwen-flash-2025-07-28",
+                messages=messages,
+                temperature=0.1,
+                max_tokens=1000,
+                stream=True,
+                stream_options=STREAM_OPTIONS
+            )
+            parser = read_stream(completion, StreamingJSONParser("results"), "semantic_search",
+                                 limit=top_k, accept=lambda item: _validate_item(item) is not None)
+
+        ai_response = parser.text
+
+        with stage("extract"):
+            results = parser.result_items()
+
+        with stage("validate"):
+            return validate_results(results)[:top_k]
 
     except json.JSONDecodeError as e:
         raise Exception(f"JSON parse failed: {str(e)}\nResponse: {ai_response}")
@@ -120,6 +150,57 @@ Tasks:
         raise Exception(f"Semantic search failed: {str(e)}")
 
 
+async def iter_semantic_search_async(query: str, tasks: List[Dict[str, Any]],
+                                     top_k: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Validated results on the async client, yielded as the model closes each one.
+
+    Cancelling the consuming task closes the HTTP request, so a superseded
+    query stops upstream instead of running to completion.
+    """
+    if not query or not tasks:
+        return
+
+    try:
+        completion = await async_client.chat.completions.create(
+            model="qwen-flash-2025-07-28",
+            messages=build_messages(query, tasks),
+            temperature=0.1,
+            max_tokens=1000,
+            stream=True,
+            stream_options=STREAM_OPTIONS
+        )
+        items = astream_items(completion, StreamingJSONParser("results"), "semantic_search",
+                              limit=top_k, accept=lambda item: _validate_item(item) is not None)
+        async for item in items:
+            yield _validate_item(item)
+    except Exception as e:
+        raise Exception(f"Semantic search failed: {str(e)}")
+
+
+def batch_semantic_search(queries: List[str], tasks: List[Dict[str, Any]], top_k: int = 10,
+                          index: TaskIndex = task_index) -> List[List[Dict[str, Any]]]:
+    """Search many queries against the same task set using embeddings.
+
+    Queries are embedded together and scored against all tasks in a single
+    matrix multiply, so cost stays close to that of one query.
+    """
+    try:
+        if not queries:
+            return []
+        if not tasks:
+            return [[] for _ in queries]
+
+        index.sync(tasks)
+        task_ids = [int(task["id"]) for task in tasks if task.get("id") is not None]
+        query_vectors = embed_texts(queries)
+
+        with stage("score"):
+            return index.search(query_vectors, task_ids, top_k=top_k, min_score=SEARCH_MIN_SCORE)
+
+    except Exception as e:
+        raise Exception(f"Batch semantic search failed: {str(e)}")
+
+
 def main():
     import sys
 
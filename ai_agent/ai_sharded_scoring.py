@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, resource_tracker, shared_memory
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from ai_vector_store import (
+    FloatVectorStore, Int8VectorStore, SharedArrays, candidate_depth, top_candidates, finish_ranking
+)
+
+load_dotenv()
+
+INDEX_SHARDS = int(os.getenv("INDEX_SHARDS", "0"))  # Worker processes for scoring; 0 disables
+INDEX_SHARD_MIN_ROWS = int(os.getenv("INDEX_SHARD_MIN_ROWS", "100000"))  # Smaller sets score in-process
+
+_STORE_TYPES = {"float": FloatVectorStore, "int8": Int8VectorStore}
+
+SCRATCH_MIN_ELEMENTS = 4096  # Initial size of each shared scratch buffer
+
+
+def _attach_segment(name: str) -> shared_memory.SharedMemory:
+    """Attach to a parent segment without registering it with the resource tracker.
+
+    The parent owns and unlinks every segment; a registration from the worker
+    would have the tracker unlink it a second time or report it as leaked.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        pass
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class _Attachment:
+    """Worker-side views of one group of parent arrays, re-attached when the parent replaces them"""
+
+    def __init__(self):
+        self.key: Optional[Tuple] = None
+        self.arrays: Dict[str, np.ndarray] = {}
+        self._segments: List[shared_memory.SharedMemory] = []
+
+    def get(self, spec: dict) -> Dict[str, np.ndarray]:
+        key = tuple(sorted((attr, seg[0]) for attr, seg in spec.items()))
+        if key != self.key:
+            self.key, self.arrays = None, {}
+            for segment in self._segments:
+                segment.close()
+            self._segments = []
+            arrays = {}
+            for attr, (segment_name, shape, dtype) in spec.items():
+                segment = _attach_segment(segment_name)
+                self._segments.append(segment)
+                arrays[attr] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf)
+            self.key, self.arrays = key, arrays
+        return self.arrays
+
+
+# Worker-side attachments: the store being scored and the scorer's scratch buffers
+_worker_store = _Attachment()
+_worker_scratch = _Attachment()
+
+
+def _attach_store(kind: str, spec: dict):
+    """Read-only view of the parent's store over its shared memory segments"""
+    store = _STORE_TYPES[kind].__new__(_STORE_TYPES[kind])
+    store.dim = spec["dim"]
+    store.exact = None
+    for attr, array in _worker_store.get(spec["arrays"]).items():
+        setattr(store, attr, array)
+    return store
+
+
+def _shard_candidates(kind: str, store_spec: dict, scratch_spec: dict, query_shape: Tuple[int, int],
+                      start: int, stop: int, depth: int):
+    """Local top-depth candidates of rows[start:stop], as positions into the full row list"""
+    store = _attach_store(kind, store_spec)
+    scratch = _worker_scratch.get(scratch_spec)
+    queries = scratch["queries"][:query_shape[0] * query_shape[1]].reshape(query_shape)
+    rows = scratch["rows"][start:stop]
+    candidates, candidate_scores = top_candidates(store.scores(queries, rows), min(depth, stop - start))
+    return candidates + start, candidate_scores
+
+
+def _shard_scores(kind: str, store_spec: dict, scratch_spec: dict, query_shape: Tuple[int, int],
+                  start: int, stop: int, offset: int, width: int) -> None:
+    """Scores of store rows start:stop, written into the shared output matrix"""
+    store = _attach_store(kind, store_spec)
+    scratch = _worker_scratch.get(scratch_spec)
+    queries = scratch["queries"][:query_shape[0] * query_shape[1]].reshape(query_shape)
+    out = scratch["scores"][:query_shape[0] * width].reshape(query_shape[0], width)
+    out[:, start - offset:stop - offset] = store.scores(queries, slice(start, stop))
+
+
+class ShardedScorer:
+    """Scores a vector store across a pool of worker processes.
+
+    Rows are split into one contiguous shard per worker. Vectors, row ids,
+    queries and full score rows all live in shared memory, so each call only
+    sends segment names and offsets to the workers. Searches return each
+    shard's local top candidates, merged (and re-scored exactly when the store
+    supports it) by the parent. Full score rows, used to maintain the
+    neighbour graph, are written by the workers straight into a shared output.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+        self._lock = threading.Lock()  # One call at a time owns the scratch buffers
+        self._scratch = SharedArrays(shared=True)
+        self._buffers: Dict[str, np.ndarray] = {}
+
+    def rank(self, store, queries: np.ndarray, rows: np.ndarray, k: int, rescore_factor: int = 1):
+        """Same contract as ai_vector_store.rank"""
+        queries = np.asarray(queries, dtype=np.float32)
+        depth = candidate_depth(store, k, len(rows), rescore_factor)
+        bounds = np.linspace(0, len(rows), self.workers + 1).astype(np.int64)
+
+        with self._lock:
+            self._put("queries", queries.ravel(), np.float32)
+            self._put("rows", rows, np.int64)
+            args = (_store_kind(store), store.shared_spec(), self._scratch.spec(self._buffers), queries.shape)
+            futures = [
+                self._pool.submit(_shard_candidates, *args, int(start), int(stop), depth)
+                for start, stop in zip(bounds[:-1], bounds[1:])
+                if stop > start
+            ]
+            shards = [future.result() for future in futures]
+
+        candidates = np.concatenate([shard[0] for shard in shards], axis=1)
+        candidate_scores = np.concatenate([shard[1] for shard in shards], axis=1)
+        merged, merged_scores = top_candidates(candidate_scores, depth)
+        candidates = np.take_along_axis(candidates, merged, axis=1)
+
+        return finish_ranking(store, queries, rows, candidates, merged_scores, k)
+
+    def scores(self, store, queries: np.ndarray, rows: slice) -> np.ndarray:
+        """store.scores(queries, rows) for a contiguous row range"""
+        queries = np.asarray(queries, dtype=np.float32)
+        start, stop = rows.start or 0, rows.stop
+        width = stop - start
+        bounds = np.linspace(start, stop, self.workers + 1).astype(np.int64)
+
+        with self._lock:
+            self._put("queries", queries.ravel(), np.float32)
+            out = self._buffer("scores", len(queries) * width, np.float32)
+            args = (_store_kind(store), store.shared_spec(), self._scratch.spec(self._buffers), queries.shape)
+            futures = [
+                self._pool.submit(_shard_scores, *args, int(shard_start), int(shard_stop), start, width)
+                for shard_start, shard_stop in zip(bounds[:-1], bounds[1:])
+                if shard_stop > shard_start
+            ]
+            for future in futures:
+                future.result()
+            return out[:len(queries) * width].reshape(len(queries), width).copy()
+
+    def warm_up(self) -> None:
+        """Start every worker process up front so the first query doesn't pay for it"""
+        list(self._pool.map(int, range(self.workers)))
+
+    def shutdown(self) -> None:
+        self._pool.shutdown()
+        self._buffers.clear()
+        self._scratch.release_all()
+
+    def _buffer(self, name: str, size: int, dtype) -> np.ndarray:
+        """Flat shared scratch array with room for size elements, grown by doubling"""
+        buffer = self._buffers.get(name)
+        if buffer is None or len(buffer) < size:
+            capacity = max(size, SCRATCH_MIN_ELEMENTS, 2 * len(buffer) if buffer is not None else 0)
+            self._buffers[name] = buffer = self._scratch.allocate(name, (capacity,), dtype)
+            self._scratch.release_retired()
+        return buffer
+
+    def _put(self, name: str, values: np.ndarray, dtype) -> None:
+        self._buffer(name, len(values), dtype)[:len(values)] = values
+
+
+def _store_kind(store) -> str:
+    return "int8" if isinstance(store, Int8VectorStore) else "float"
+
+
+_sharded_scorer: Optional[ShardedScorer] = None
+_sharded_scorer_lock = threading.Lock()
+
+
+def get_sharded_scorer() -> Optional[ShardedScorer]:
+    """Shared scorer when INDEX_SHARDS is set, created with its workers started on first use.
+
+    Starting the pool takes seconds, so call this before taking an index lock.
+    """
+    global _sharded_scorer
+    if INDEX_SHARDS <= 0:
+        return None
+    with _sharded_scorer_lock:
+        if _sharded_scorer is None:
+            scorer = ShardedScorer(INDEX_SHARDS)
+            scorer.warm_up()
+            _sharded_scorer = scorer
+    return _sharded_scorer
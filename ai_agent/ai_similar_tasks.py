@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 import json
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from openai import OpenAI
 from dotenv import load_dotenv
+from ai_profiling import stage
+from ai_json_stream import StreamingJSONParser, STREAM_OPTIONS, read_stream
 
 load_dotenv()
 
@@ -65,6 +67,21 @@ Output: {"similar_tasks": [{"task_id": 7, "score": 0.75}, {"task_id": 5, "score"
 """
 
 
+def _validate_task(task: Any) -> Optional[Dict[str, Any]]:
+    if isinstance(task, dict) and "task_id" in task and "score" in task:
+        try:
+            score = float(task["score"])
+            task_id = int(task["task_id"])
+        except (TypeError, ValueError, OverflowError):
+            return None
+        if 0.0 <= score <= 1.0 and score >= 0.3:  # Only scores >= 0.3
+            return {
+                "task_id": task_id,
+                "score": round(score, 2)
+            }
+    return None
+
+
 def find_similar_tasks(target_task: Dict[str, Any], all_tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Find similar tasks using AI"""
     try:
@@ -102,40 +119,35 @@ Existing tasks:
 {json.dumps(task_list, ensure_ascii=False)}"""
 
         # Call AI
-        completion = client.chat.completions.create(
-            model="qwen-flash-2025-07-28",
-            messages=[
-                {"role": "system", "content": get_system_prompt()},
-                {"role": "user", "content": user_input}
-            ],
-            temperature=0.1,
-            max_tokens=500
-        )
-
-        ai_response = completion.choices[0].message.content.strip()
-
-        # Clean markdown
-        if "```json" in ai_response:
-            ai_response = ai_response.split("```json")[1].split("```")[0].strip()
-        elif "```" in ai_response:
-            ai_response = ai_response.split("```")[1].split("```")[0].strip()
-
-        # Parse JSON
-        result = json.loads(ai_response)
-        similar_tasks = result.get("similar_tasks", [])
+        with stage("upstream"):
+            completion = client.chat.completions.create(
+                model="qwen-flash-2025-07-28",
+                messages=[
+                    {"role": "system", "content": get_system_prompt()},
+                    {"role": "user", "content": user_input}
+                ],
+                temperature=0.1,
+                max_tokens=500,
+                stream=True,
+                stream_options=STREAM_OPTIONS
+            )
+            # Stop generating once 5 usable matches are in
+            parser = read_stream(completion, StreamingJSONParser("similar_tasks"), "similar_tasks",
+                                 limit=5, accept=lambda task: _validate_task(task) is not None)
+
+        ai_response = parser.text
+
+        with stage("extract"):
+            similar_tasks = parser.result_items()
 
         # Validate results
         valid_tasks = []
-        for task in similar_tasks[:5]:  # Max 5 tasks
-            if isinstance(task, dict) and "task_id" in task and "score" in task:
-                score = float(task["score"])
-                if 0.0 <= score <= 1.0 and score >= 0.3:  # Only scores >= 0.3
-                    valid_tasks.append({
-                        "task_id": int(task["task_id"]),
-                        "score": round(score, 2)
-                    })
-
-        return valid_tasks
+        for task in similar_tasks:
+            valid = _validate_task(task)
+            if valid is not None:
+                valid_tasks.append(valid)
+
+        return valid_tasks[:5]  # Max 5 tasks
 
     except json.JSONDecodeError as e:
         raise Exception(f"JSON parse failed: {str(e)}\nResponse: {ai_response}")
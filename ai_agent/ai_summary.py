@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 import json
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional
 from openai import OpenAI
 from dotenv import load_dotenv
+from ai_profiling import stage
+from ai_json_stream import StreamingJSONParser, STREAM_OPTIONS, read_stream
+from ai_task_stats import compute_task_stats
 
 load_dotenv()
 
@@ -21,9 +24,10 @@ client = OpenAI(
 def get_system_prompt() -> str:
     return """You are an assistant that summarizes task activity.
 
-Given a list of tasks, generate a concise summary in English.
+Given precomputed statistics for a set of tasks, generate a concise summary in English.
 
 Rules:
+- The numbers are exact; use them as given and never recount or invent figures
 - Focus on progress and patterns
 - Mention completed vs pending tasks
 - Highlight priority items
@@ -42,26 +46,24 @@ JSON schema:
 Examples:
 
 Input:
-Tasks: [
-  {"title": "Complete login page", "status": "COMPLETED", "priority": "HIGH"},
-  {"title": "Fix database bug", "status": "IN_PROGRESS", "priority": "HIGH"},
-  {"title": "Write documentation", "status": "PENDING", "priority": "LOW"}
-]
+Stats: {"period": "daily", "total": 3, "by_status": {"PENDING": 1, "IN_PROGRESS": 1, "COMPLETED": 1}, "by_priority": {"LOW": 1, "MEDIUM": 0, "HIGH": 2}, "completed": 1, "open": 2, "completion_rate": 0.333, "overdue": 0, "due_today": 1, "high_priority_open": 1, "highlights": {"overdue": [], "in_progress": ["Fix database bug"], "high_priority_open": ["Fix database bug"], "completed_high_priority": ["Complete login page"]}}
 
-Output: {"summary": "Today has 3 tasks. Completed 1 high-priority task (login page). Currently working on database bug fix. One low-priority task pending (documentation). Good overall progress with key work completed. Focus on completing the high-priority database fix."}
+Output: {"summary": "Today has 3 tasks. Completed 1 high-priority task (login page). Currently working on database bug fix. One low-priority task pending. Good overall progress with key work completed. Focus on completing the high-priority database fix."}
 
 Input:
-Tasks: [
-  {"title": "Setup CI/CD pipeline", "status": "COMPLETED", "priority": "HIGH"},
-  {"title": "Code review PR #123", "status": "COMPLETED", "priority": "MEDIUM"},
-  {"title": "Update dependencies", "status": "PENDING", "priority": "LOW"}
-]
+Stats: {"period": "daily", "total": 3, "by_status": {"PENDING": 1, "IN_PROGRESS": 0, "COMPLETED": 2}, "by_priority": {"LOW": 1, "MEDIUM": 1, "HIGH": 1}, "completed": 2, "open": 1, "completion_rate": 0.667, "overdue": 1, "due_today": 0, "high_priority_open": 0, "highlights": {"overdue": ["Update dependencies"], "in_progress": [], "high_priority_open": [], "completed_high_priority": ["Setup CI/CD pipeline"]}}
 
-Output: {"summary": "Completed 2 out of 3 tasks today. Successfully set up CI/CD pipeline (high priority) and reviewed PR #123. One low-priority task remains: updating dependencies. Strong progress on critical infrastructure work. Consider scheduling the dependency update for tomorrow."}
+Output: {"summary": "Completed 2 out of 3 tasks today, including the high-priority CI/CD pipeline setup. One low-priority task remains and is overdue: updating dependencies. Strong progress on critical infrastructure work. Consider scheduling the dependency update as soon as possible."}
 """
 
 
-def generate_summary(tasks: List[Dict[str, Any]], period: str = "daily") -> str:
+SUMMARY_STEPS = 3  # Statistics, model response, parsed summary
+
+
+def generate_summary(tasks: List[Dict[str, Any]], period: str = "daily",
+                     on_progress: Optional[Callable[[int, int], None]] = None) -> str:
+    """on_progress(step, SUMMARY_STEPS) is called as each step completes"""
+    progress = on_progress or (lambda step, total: None)
     try:
         if not tasks:
             if period == "daily":
@@ -69,43 +71,41 @@ def generate_summary(tasks: List[Dict[str, Any]], period: str = "daily") -> str:
             else:
                 return "No tasks this week. Consider creating some tasks to organize your work."
 
-        task_data = []
-        for task in tasks:
-            task_info = {
-                "title": task.get("title", ""),
-                "status": task.get("status", "PENDING"),
-                "priority": task.get("priority", "MEDIUM"),
-            }
-            if task.get("dueAt"):
-                task_info["dueAt"] = task["dueAt"]
-            task_data.append(task_info)
+        # Counting is done locally; the model only writes prose around exact facts
+        stats = compute_task_stats(tasks, period)
+        stats.pop("date", None)
+        if period != "weekly":
+            stats.pop("workload", None)
+        progress(1, SUMMARY_STEPS)
 
         period_text = "this week" if period == "weekly" else "today"
-        user_input = f"Tasks for {period_text}:\n{json.dumps(task_data, ensure_ascii=False, indent=2)}"
-
-        completion = client.chat.completions.create(
-            model="qwen-flash-2025-07-28",
-            messages=[
-                {"role": "system", "content": get_system_prompt()},
-                {"role": "user", "content": user_input}
-            ],
-            temperature=0.3,
-            max_tokens=500
-        )
-
-        ai_response = completion.choices[0].message.content.strip()
-
-        if "```json" in ai_response:
-            ai_response = ai_response.split("```json")[1].split("```")[0].strip()
-        elif "```" in ai_response:
-            ai_response = ai_response.split("```")[1].split("```")[0].strip()
-
-        result = json.loads(ai_response)
+        user_input = f"Task statistics for {period_text}:\nStats: {json.dumps(stats, ensure_ascii=False)}"
+
+        with stage("upstream"):
+            completion = client.chat.completions.create(
+                model="qwen-flash-2025-07-28",
+                messages=[
+                    {"role": "system", "content": get_system_prompt()},
+                    {"role": "user", "content": user_input}
+                ],
+                temperature=0.3,
+                max_tokens=500,
+                stream=True,
+                stream_options=STREAM_OPTIONS
+            )
+            parser = read_stream(completion, StreamingJSONParser(), "summary")
+        progress(2, SUMMARY_STEPS)
+
+        ai_response = parser.text
+
+        with stage("extract"):
+            result = parser.result()
         summary = result.get("summary", "")
 
         if not summary:
             raise Exception("AI returned empty summary")
 
+        progress(3, SUMMARY_STEPS)
         return summary
 
     except json.JSONDecodeError as e:
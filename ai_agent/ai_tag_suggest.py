@@ -2,9 +2,11 @@
 import json
 import os
 import requests
-from typing import List
+from typing import Dict, List, Optional, Callable
 from openai import OpenAI
 from dotenv import load_dotenv
+from ai_profiling import stage
+from ai_json_stream import StreamingJSONParser, STREAM_OPTIONS, read_stream
 
 load_dotenv()
 
@@ -20,10 +22,10 @@ client = OpenAI(
 )
 
 
-def fetch_existing_tags() -> List[str]:
-    """从后端获取所有现有标签"""
+def fetch_existing_tags(headers: Optional[Dict[str, str]] = None) -> List[str]:
+    """从后端获取所有现有标签（headers 由调用方传入，如租户头）"""
     try:
-        response = requests.get(f"{BACKEND_API_URL}/api/tasks/tags", timeout=5)
+        response = requests.get(f"{BACKEND_API_URL}/api/tasks/tags", headers=headers, timeout=5)
         response.raise_for_status()
         tags = response.json()
         return tags if isinstance(tags, list) else []
@@ -32,15 +34,13 @@ def fetch_existing_tags() -> List[str]:
         return []
 
 
-def get_system_prompt(existing_tags: List[str]) -> str:
-    tags_list = ", ".join(f'"{tag}"' for tag in existing_tags) if existing_tags else "暂无已有标签"
-    
-    return f"""You are an expert task tagging assistant for a task management system.
+# Static prompt, built once at import. Keep it byte-identical across calls so the
+# provider can cache the prefix; the tag list and task go in the user message.
+SYSTEM_PROMPT = """You are an expert task tagging assistant for a task management system.
 
 Your goal is to suggest practical, meaningful tags that help users organize and find tasks easily.
 
-**Available tags in the system:**
-{tags_list}
+Each request lists the **available tags in the system** followed by the task to tag.
 
 **Tag Selection Strategy:**
 1. **Prioritize existing tags** - Always prefer tags from the available list when they match the task
@@ -60,9 +60,9 @@ Your goal is to suggest practical, meaningful tags that help users organize and
 Return STRICT JSON ONLY. No explanation, no markdown.
 
 JSON schema:
-{{
+{
   "tags": string[]
-}}
+}
 
 **Examples:**
 
@@ -71,63 +71,74 @@ Title: 完成前端登录页面
 Description: 使用 React 和 Tailwind CSS 实现用户认证
 
 Available tags: "frontend", "backend", "react", "vue", "bug", "feature"
-Output: {{"tags": ["frontend", "react", "feature", "认证", "ui"]}}
+Output: {"tags": ["frontend", "react", "feature", "认证", "ui"]}
 
 Input:
 Title: Fix MySQL slow query performance issue
 Description: Users reporting 5s load time on dashboard
 
 Available tags: "backend", "database", "frontend", "bug", "performance", "urgent"
-Output: {{"tags": ["backend", "database", "bug", "performance", "urgent"]}}
+Output: {"tags": ["backend", "database", "bug", "performance", "urgent"]}
 
 Input:
 Title: 研究 Redis 缓存方案
 Description: 评估不同的缓存策略
 
 Available tags: "backend", "研究", "性能优化"
-Output: {{"tags": ["backend", "redis", "研究", "性能优化", "cache"]}}
+Output: {"tags": ["backend", "redis", "研究", "性能优化", "cache"]}
 
 Input:
 Title: Write API documentation for v2 endpoints
 Description: Document all new REST APIs
 
 Available tags: "docs", "api", "backend"
-Output: {{"tags": ["docs", "api", "backend", "writing"]}}
+Output: {"tags": ["docs", "api", "backend", "writing"]}
 """
 
 
-def suggest_tags_with_ai(title: str, description: str = None) -> List[str]:
+def get_system_prompt() -> str:
+    return SYSTEM_PROMPT
+
+
+def build_messages(title: str, description: str = None, existing_tags: List[str] = None) -> list:
+    """Static system prompt first, variable parts (tag list, task) last"""
+    tags_list = ", ".join(f'"{tag}"' for tag in existing_tags) if existing_tags else "暂无已有标签"
+
+    user_input = f"Title: {title}"
+    if description:
+        user_input += f"\nDescription: {description}"
+
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"**Available tags in the system:**\n{tags_list}\n\n请为以下任务推荐标签（优先使用已有标签）：\n\n{user_input}"}
+    ]
+
+
+def suggest_tags_with_ai(title: str, description: str = None,
+                         fetch_tags: Optional[Callable[[], List[str]]] = None) -> List[str]:
+    """fetch_tags supplies the tag dictionary (e.g. a tenant's cached copy); defaults to the backend"""
     try:
         # Get existing tags from backend
-        existing_tags = fetch_existing_tags()
-        
-        # Build user input
-        user_input = f"Title: {title}"
-        if description:
-            user_input += f"\nDescription: {description}"
+        with stage("fetch_tags"):
+            existing_tags = fetch_tags() if fetch_tags is not None else fetch_existing_tags()
         
         # Call AI
-        completion = client.chat.completions.create(
-            model="qwen-flash-2025-07-28",
-            messages=[
-                {"role": "system", "content": get_system_prompt(existing_tags)},
-                {"role": "user", "content": f"请为以下任务推荐标签（优先使用已有标签）：\n\n{user_input}"}
-            ],
-            temperature=0.1,  # 降低温度，使输出更稳定和确定性
-            max_tokens=300
-        )
-        
-        ai_response = completion.choices[0].message.content.strip()
+        with stage("upstream"):
+            completion = client.chat.completions.create(
+                model="qwen-flash-2025-07-28",
+                messages=build_messages(title, description, existing_tags),
+                temperature=0.1,  # 降低温度，使输出更稳定和确定性
+                max_tokens=300,
+                stream=True,
+                stream_options=STREAM_OPTIONS
+            )
+            parser = read_stream(completion, StreamingJSONParser("tags"), "suggest_tags")
         
-        # Clean markdown code blocks
-        if "```json" in ai_response:
-            ai_response = ai_response.split("```json")[1].split("```")[0].strip()
-        elif "```" in ai_response:
-            ai_response = ai_response.split("```")[1].split("```")[0].strip()
+        ai_response = parser.text
         
-        # Parse JSON
-        result = json.loads(ai_response)
-        tags = result.get("tags", [])
+        with stage("extract"):
+            # Tags closed before a truncation are kept
+            tags = parser.result_items()
         
         # Validate and clean tags
         cleaned_tags = []
@@ -156,7 +167,6 @@ def suggest_tags_with_ai(title: str, description: str = None) -> List[str]:
         
         if len(cleaned_tags) < 3:
             # Add generic tags if too few
-            existing_tags = fetch_existing_tags()
             if existing_tags and len(cleaned_tags) < 3:
                 for etag in existing_tags[:3]:
                     if etag.lower() not in cleaned_tags:
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import threading
+from typing import List, Dict, Any, Optional, Tuple, Set
+import numpy as np
+from dotenv import load_dotenv
+from ai_embeddings import embed_texts, task_to_text, task_fingerprint, EMBEDDING_DIMENSIONS
+from ai_vector_store import make_vector_store, rank, INDEX_QUANTIZATION, INDEX_RESCORE_FACTOR
+from ai_sharded_scoring import get_sharded_scorer, INDEX_SHARDS, INDEX_SHARD_MIN_ROWS
+
+load_dotenv()
+
+SIMILAR_TOP_K = 5  # Max similar tasks kept per task
+# Cosine cutoff. The LLM prompt's 0.3 is on its own scale: embeddings of unrelated
+# short tasks already score 0.3-0.4. Recalibrate with `python ai_eval.py calibrate`
+SIMILAR_MIN_SCORE = float(os.getenv("SIMILAR_MIN_SCORE", "0.5"))
+GRAPH_BYTES_PER_TASK = 1024  # Rough: fingerprint, neighbour list and referrer set per task
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, ordered by score descending"""
+    if k <= 0 or len(scores) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if len(scores) > k:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class TaskIndex:
+    """Embedding index of tasks with an incrementally maintained top-k neighbour graph.
+
+    Each task keeps its k most similar tasks (score >= min_score). Creating,
+    editing or deleting a task only touches that task and the tasks whose
+    neighbour lists it enters or leaves, so similar-task lookups are O(1).
+    Vectors live in a float32 or int8-quantized store (see ai_vector_store);
+    with INDEX_SHARDS set, searches and graph updates over large indexes are
+    scored across worker processes.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIMENSIONS, k: int = SIMILAR_TOP_K,
+                 min_score: float = SIMILAR_MIN_SCORE, quantization: str = INDEX_QUANTIZATION,
+                 rescore_factor: int = INDEX_RESCORE_FACTOR, max_tasks: Optional[int] = None):
+        self.dim = dim
+        self.max_tasks = max_tasks
+        self.k = k
+        self.min_score = min_score
+        self.rescore_factor = rescore_factor
+        self._lock = threading.RLock()
+        self._store = make_vector_store(dim, 16, quantization, shared=INDEX_SHARDS > 0)
+        self._active = np.zeros(16, dtype=bool)
+        self._kth = np.full(16, -np.inf, dtype=np.float32)  # Score to beat to enter each row's list
+        self._row_ids: List[Optional[int]] = []
+        self._rows: Dict[int, int] = {}
+        self._free_rows: List[int] = []
+        self._fingerprints: Dict[int, str] = {}
+        self._neighbours: Dict[int, List[Tuple[float, int]]] = {}
+        self._referrers: Dict[int, Set[int]] = {}  # task -> tasks whose lists contain it
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, task_id: int) -> bool:
+        return task_id in self._rows
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the vector store"""
+        return self._store.nbytes
+
+    @property
+    def row_nbytes(self) -> int:
+        """Approximate memory per indexed task: its vector plus graph bookkeeping"""
+        return self._store.row_nbytes + GRAPH_BYTES_PER_TASK
+
+    def sync(self, tasks: List[Dict[str, Any]]) -> List[int]:
+        """Index new or edited tasks, returning the ids that were (re)embedded"""
+        changed = {}
+        for task in tasks:
+            if task.get("id") is None:
+                continue
+            task_id = int(task["id"])
+            fingerprint = task_fingerprint(task)
+            if self._fingerprints.get(task_id) != fingerprint:
+                changed[task_id] = (task, fingerprint)
+
+        if not changed:
+            return []
+
+        # Refuse before embedding, so a full index costs no upstream calls
+        if self.max_tasks is not None:
+            new_count = sum(1 for task_id in changed if task_id not in self._rows)
+            if len(self._rows) + new_count > self.max_tasks:
+                raise RuntimeError(
+                    f"Index is full: {len(self._rows)} + {new_count} tasks exceeds the limit of {self.max_tasks}"
+                )
+
+        # Embed outside the lock; the upstream call dominates the cost
+        ids = list(changed.keys())
+        vectors = embed_texts([task_to_text(changed[task_id][0]) for task_id in ids])
+
+        for task_id, vector in zip(ids, vectors):
+            self.upsert(task_id, vector, changed[task_id][1])
+            # Yield the GIL between upserts so a long reindex doesn't stall other requests
+            time.sleep(0)
+
+        return ids
+
+    def upsert(self, task_id: int, vector: np.ndarray, fingerprint: Optional[str] = None) -> None:
+        """Insert or replace a task vector and update the affected neighbour lists"""
+        scorer = self._scorer()
+        with self._lock:
+            dirty = set()
+            if task_id in self._rows:
+                row = self._rows[task_id]
+                dirty = self._detach(task_id)
+            else:
+                row = self._allocate_row(task_id)
+
+            self._store.set(row, vector)
+            self._active[row] = True
+            self._fingerprints[task_id] = fingerprint
+
+            scores = self._row_scores(row, scorer)
+            self._set_neighbours(task_id, scores)
+
+            # Offer the task to every list it now beats the k-th entry of
+            entering = np.nonzero((scores >= self.min_score) & (scores > self._kth[:len(scores)]))[0]
+            for other_row in entering:
+                other_id = self._row_ids[other_row]
+                if other_id not in dirty:
+                    self._offer(other_id, task_id, float(scores[other_row]))
+
+            # Tasks that lost this task from their list need a rescan to refill
+            for other_id in dirty:
+                if other_id in self._rows:
+                    self._set_neighbours(other_id, self._row_scores(self._rows[other_id], scorer))
+
+    def remove(self, task_id: int) -> bool:
+        """Drop a task from the index, refilling the lists it leaves"""
+        scorer = self._scorer()
+        with self._lock:
+            if task_id not in self._rows:
+                return False
+
+            dirty = self._detach(task_id)
+            row = self._rows.pop(task_id)
+            self._active[row] = False
+            self._kth[row] = -np.inf
+            self._row_ids[row] = None
+            self._free_rows.append(row)
+            self._fingerprints.pop(task_id, None)
+            self._neighbours.pop(task_id, None)
+            self._referrers.pop(task_id, None)
+
+            for other_id in dirty:
+                self._set_neighbours(other_id, self._row_scores(self._rows[other_id], scorer))
+            return True
+
+    def similar(self, task_id: int, candidate_ids: Optional[Set[int]] = None) -> Optional[List[Dict[str, Any]]]:
+        """Similar tasks for an indexed task, or None if the task is not indexed"""
+        with self._lock:
+            if task_id not in self._rows:
+                return None
+            neighbours = self._neighbours.get(task_id, [])
+            if candidate_ids is not None:
+                kept = [n for n in neighbours if n[1] in candidate_ids]
+                # A full list that lost entries to the filter may hide candidates
+                # below the cut, so rescan the candidates to refill it
+                if len(kept) < len(neighbours) == self.k:
+                    kept = self._candidate_neighbours(task_id, candidate_ids)
+                neighbours = kept
+            return [{"task_id": other_id, "score": round(score, 2)} for score, other_id in neighbours]
+
+    def search(self, query_vectors: np.ndarray, task_ids: Optional[List[int]] = None,
+               top_k: int = 10, min_score: float = 0.0) -> List[List[Dict[str, Any]]]:
+        """Score many queries against indexed tasks in one matrix multiply.
+
+        Returns a ranked top-k list per query, restricted to task_ids when given.
+        With a quantized store that keeps exact vectors, the top k * rescore_factor
+        candidates are re-scored exactly before the final ranking.
+        """
+        query_vectors = np.asarray(query_vectors, dtype=np.float32)
+        scorer = self._scorer()
+        with self._lock:
+            used = len(self._row_ids)
+            if task_ids is None:
+                rows = np.nonzero(self._active[:used])[0]
+            else:
+                rows = np.array([self._rows[t] for t in task_ids if t in self._rows], dtype=np.int64)
+            ids = np.array([self._row_ids[row] for row in rows], dtype=np.int64)
+
+            k = min(top_k, len(rows))
+            if k <= 0:
+                return [[] for _ in range(len(query_vectors))]
+
+            # Per-query top-k for the whole batch at once
+            if scorer is not None and len(rows) >= INDEX_SHARD_MIN_ROWS:
+                top, top_scores = scorer.rank(self._store, query_vectors, rows, k, self.rescore_factor)
+            else:
+                top, top_scores = rank(self._store, query_vectors, rows, k, self.rescore_factor)
+
+        return [
+            [
+                {"task_id": int(task_id), "score": round(float(score), 2)}
+                for task_id, score in zip(ids[query_top], query_scores)
+                if score >= min_score
+            ]
+            for query_top, query_scores in zip(top, top_scores)
+        ]
+
+    def _allocate_row(self, task_id: int) -> int:
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self._row_ids[row] = task_id
+        else:
+            row = len(self._row_ids)
+            if row >= len(self._store):
+                self._grow()
+            self._row_ids.append(task_id)
+        self._rows[task_id] = row
+        return row
+
+    def _grow(self) -> None:
+        capacity = len(self._store) * 2
+        if self.max_tasks is not None:
+            # Allocate no more than the limit allows, so capacity stays within the memory quota
+            capacity = max(min(capacity, self.max_tasks), len(self._store) + 1)
+        self._store.resize(capacity)
+        active = np.zeros(capacity, dtype=bool)
+        active[:len(self._active)] = self._active
+        kth = np.full(capacity, -np.inf, dtype=np.float32)
+        kth[:len(self._kth)] = self._kth
+        self._active, self._kth = active, kth
+
+    def _scorer(self):
+        """The sharded scorer once the index is large enough to use it. Fetched
+        before taking the lock, since the first call starts the worker pool"""
+        return get_sharded_scorer() if len(self._rows) >= INDEX_SHARD_MIN_ROWS else None
+
+    def _row_scores(self, row: int, scorer=None) -> np.ndarray:
+        """Cosine scores of one row against all rows; inactive rows and itself are -inf"""
+        used = len(self._row_ids)
+        query = self._store.get(row)[None, :]
+        if scorer is not None and used >= INDEX_SHARD_MIN_ROWS:
+            scores = scorer.scores(self._store, query, slice(0, used))[0]
+        else:
+            scores = self._store.scores(query, slice(0, used))[0]
+        scores[~self._active[:used]] = -np.inf
+        scores[row] = -np.inf
+        return scores
+
+    def _candidate_neighbours(self, task_id: int, candidate_ids: Set[int]) -> List[Tuple[float, int]]:
+        """Top-k neighbours of a task among the given candidates only"""
+        rows = np.array([self._rows[c] for c in candidate_ids if c in self._rows and c != task_id], dtype=np.int64)
+        if len(rows) == 0:
+            return []
+        scores = self._store.scores(self._store.get(self._rows[task_id])[None, :], rows)[0]
+        return [
+            (float(scores[i]), self._row_ids[rows[i]])
+            for i in top_k_indices(scores, self.k)
+            if scores[i] >= self.min_score
+        ]
+
+    def _detach(self, task_id: int) -> Set[int]:
+        """Remove a task from all neighbour lists; returns the tasks that lost it"""
+        for _, other_id in self._neighbours.get(task_id, []):
+            self._referrers.get(other_id, set()).discard(task_id)
+        self._neighbours[task_id] = []
+
+        dirty = self._referrers.pop(task_id, set())
+        for other_id in dirty:
+            self._neighbours[other_id] = [n for n in self._neighbours[other_id] if n[1] != task_id]
+        return dirty
+
+    def _set_neighbours(self, task_id: int, scores: np.ndarray) -> None:
+        for _, other_id in self._neighbours.get(task_id, []):
+            self._referrers.get(other_id, set()).discard(task_id)
+
+        neighbours = []
+        for other_row in top_k_indices(scores, self.k):
+            if scores[other_row] < self.min_score:
+                break
+            other_id = self._row_ids[other_row]
+            neighbours.append((float(scores[other_row]), other_id))
+            self._referrers.setdefault(other_id, set()).add(task_id)
+
+        self._neighbours[task_id] = neighbours
+        self._update_kth(task_id)
+
+    def _offer(self, task_id: int, candidate_id: int, score: float) -> None:
+        neighbours = self._neighbours.setdefault(task_id, [])
+        neighbours.append((score, candidate_id))
+        neighbours.sort(key=lambda n: n[0], reverse=True)
+        self._referrers.setdefault(candidate_id, set()).add(task_id)
+
+        if len(neighbours) > self.k:
+            _, evicted_id = neighbours.pop()
+            self._referrers.get(evicted_id, set()).discard(task_id)
+        self._update_kth(task_id)
+
+    def _update_kth(self, task_id: int) -> None:
+        neighbours = self._neighbours[task_id]
+        self._kth[self._rows[task_id]] = neighbours[-1][0] if len(neighbours) >= self.k else -np.inf
+
+
+task_index = TaskIndex()
+
+
+def main():
+    import sys
+
+    if len(sys.argv) < 3:
+        print("Usage: python ai_task_index.py <task_id> <all_tasks_json>", file=sys.stderr)
+        print("\nExample:", file=sys.stderr)
+        print('  python ai_task_index.py 1 \'[{"id":1,"title":"Fix bug"},{"id":2,"title":"Debug issue"}]\'', file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        task_id = int(sys.argv[1])
+        task_index.sync(json.loads(sys.argv[2]))
+        similar = task_index.similar(task_id) or []
+        print(json.dumps({"similar_tasks": similar}, ensure_ascii=False, indent=2))
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
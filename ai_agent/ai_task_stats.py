@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+import json
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+STATUSES = ["PENDING", "IN_PROGRESS", "COMPLETED"]
+PRIORITIES = ["LOW", "MEDIUM", "HIGH"]
+HIGHLIGHT_LIMIT = 5  # Titles listed per highlight group
+
+
+def _parse_due_dates(values: List[Any]) -> np.ndarray:
+    """ISO strings (backend LocalDateTime) to datetime64[s]; missing or invalid become NaT"""
+    cleaned = [value[:19] if isinstance(value, str) and value else "NaT" for value in values]
+    try:
+        return np.array(cleaned, dtype="datetime64[s]")
+    except ValueError:
+        parsed = []
+        for value in cleaned:
+            try:
+                parsed.append(np.datetime64(value, "s"))
+            except ValueError:
+                parsed.append(np.datetime64("NaT"))
+        return np.array(parsed, dtype="datetime64[s]")
+
+
+def compute_task_stats(tasks: List[Dict[str, Any]], period: str = "daily",
+                       now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Status/priority breakdowns, overdue and due-today counts and per-day workload.
+
+    Everything is computed per calendar day: a task is overdue once its due
+    day has passed, and the weekly workload covers Monday to Sunday of the
+    current week. Results therefore only change at midnight, so callers can
+    cache them by date. All date math is vectorized over the task set with
+    numpy datetime64.
+    """
+    now = now or datetime.now()
+    today = np.datetime64(now.date(), "D")
+    if period == "weekly":
+        window = today - now.weekday() + np.arange(7)
+    else:
+        window = today + np.arange(1)
+
+    status = np.array([task.get("status") or "PENDING" for task in tasks], dtype=object)
+    priority = np.array([task.get("priority") or "MEDIUM" for task in tasks], dtype=object)
+    due = _parse_due_dates([task.get("dueAt") or task.get("due_at") for task in tasks])
+    due_day = due.astype("datetime64[D]")
+
+    has_due = ~np.isnat(due)
+    completed = status == "COMPLETED"
+    open_ = ~completed
+    overdue = open_ & has_due & (due_day < today)
+    due_today = open_ & has_due & (due_day == today)
+    high_open = open_ & (priority == "HIGH")
+
+    # Workload per day over the period window: due tasks, and how many are done
+    in_window = has_due[:, None] & (due_day[:, None] == window[None, :])
+    due_per_day = in_window.sum(axis=0)
+    done_per_day = (in_window & completed[:, None]).sum(axis=0)
+
+    def titles(mask: np.ndarray) -> List[str]:
+        return [tasks[i].get("title", "") for i in np.nonzero(mask)[0][:HIGHLIGHT_LIMIT]]
+
+    total = len(tasks)
+    return {
+        "period": period,
+        "date": str(today),
+        "total": total,
+        "by_status": {s: int(np.count_nonzero(status == s)) for s in STATUSES},
+        "by_priority": {p: int(np.count_nonzero(priority == p)) for p in PRIORITIES},
+        "completed": int(np.count_nonzero(completed)),
+        "open": int(np.count_nonzero(open_)),
+        "completion_rate": round(float(np.count_nonzero(completed)) / total, 3) if total else 0.0,
+        "overdue": int(np.count_nonzero(overdue)),
+        "due_today": int(np.count_nonzero(due_today)),
+        "high_priority_open": int(np.count_nonzero(high_open)),
+        "workload": [
+            {"date": str(day), "due": int(count), "completed": int(done)}
+            for day, count, done in zip(window, due_per_day, done_per_day)
+        ],
+        "highlights": {
+            "overdue": titles(overdue),
+            "in_progress": titles(status == "IN_PROGRESS"),
+            "high_priority_open": titles(high_open),
+            "completed_high_priority": titles(completed & (priority == "HIGH")),
+        },
+    }
+
+
+def main():
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python ai_task_stats.py <tasks_json> [period]", file=sys.stderr)
+        print("\nExample:", file=sys.stderr)
+        print('  python ai_task_stats.py \'[{"title":"Complete login","status":"COMPLETED"}]\' weekly', file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        tasks = json.loads(sys.argv[1])
+        period = sys.argv[2] if len(sys.argv) > 2 else "daily"
+        print(json.dumps(compute_task_stats(tasks, period), ensure_ascii=False, indent=2))
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+import os
+import re
+import hmac
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from ai_task_index import TaskIndex, task_index, GRAPH_BYTES_PER_TASK
+
+load_dotenv()
+
+TENANT_HEADER = "X-Tenant-Id"  # Team or user key; requests without it share the default tenant
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+DEFAULT_TENANT = "default"
+# Per tenant: index + cached responses. 256 MB holds ~87k tasks with 512-dim float32
+# vectors (~3 KB each with graph bookkeeping); 1M tasks need ~3 GB, or ~1.5 GB with int8
+TENANT_MEMORY_QUOTA_MB = float(os.getenv("TENANT_MEMORY_QUOTA_MB", "256"))
+TENANT_TOTAL_MEMORY_MB = float(os.getenv("TENANT_TOTAL_MEMORY_MB", "1024"))  # All tenants together
+TENANT_IDLE_SECONDS = float(os.getenv("TENANT_IDLE_SECONDS", "600"))  # Idle tenants may lose their index when over budget
+TENANT_RESPONSE_TTL = float(os.getenv("TENANT_RESPONSE_TTL", "300"))  # Seconds cached AI responses are reused
+TENANT_TAGS_TTL = float(os.getenv("TENANT_TAGS_TTL", "60"))  # Seconds a fetched tag dictionary is reused
+TENANT_MAX = int(os.getenv("TENANT_MAX", "100"))  # Tenants held at once, the default one included
+# Comma-separated tenant ids to accept; empty accepts any well-formed id (up to TENANT_MAX at once)
+TENANT_IDS = frozenset(t.strip() for t in os.getenv("TENANT_IDS", "").split(",") if t.strip())
+TENANT_ADMIN_TOKEN = os.getenv("TENANT_ADMIN_TOKEN", "")  # Unlocks every tenant's stats; unset disables
+
+ENTRY_OVERHEAD_BYTES = 200  # Rough per-entry cost of the cache bookkeeping
+
+_TENANT_ID = re.compile(r"^[A-Za-z0-9_.:-]{1,64}$")
+
+_MB = 1024 * 1024
+
+
+def is_admin(token: Optional[str]) -> bool:
+    return bool(TENANT_ADMIN_TOKEN and token) and hmac.compare_digest(token, TENANT_ADMIN_TOKEN)
+
+
+def response_key(feature: str, *parts: Any) -> str:
+    """Cache key for an AI response from its inputs"""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return f"{feature}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+
+class Tenant:
+    """Everything the agent keeps in memory for one tenant.
+
+    The task index (snapshots, embeddings, neighbour graph), the tag
+    dictionary and cached AI responses are private to the tenant, with their
+    own locks, so one tenant's reindex never blocks another's lookups. The
+    index is capped by the memory quota (its vector store never grows past
+    max_tasks rows); cached responses make room for it and are evicted least
+    recently used first.
+    """
+
+    def __init__(self, tenant_id: str, quota_bytes: int, index: Optional[TaskIndex] = None):
+        self.id = tenant_id
+        self.quota_bytes = quota_bytes
+        self.index = index if index is not None else TaskIndex()
+        self.index.max_tasks = max(quota_bytes // self.index.row_nbytes, 1)
+        self.last_used = time.time()
+        self._lock = threading.Lock()
+        self._responses: "OrderedDict[str, Tuple[float, Any, int]]" = OrderedDict()
+        self._response_bytes = 0
+        self._tags: Optional[Tuple[float, List[str]]] = None
+        self._tag_bytes = 0
+        self.stats = {
+            "response_hits": 0,
+            "response_misses": 0,
+            "response_evictions": 0,
+            "tag_hits": 0,
+            "tag_misses": 0,
+        }
+
+    @property
+    def index_bytes(self) -> int:
+        """Allocated vector capacity, indexed or not, plus graph bookkeeping per task"""
+        return self.index.nbytes + len(self.index) * GRAPH_BYTES_PER_TASK
+
+    @property
+    def empty(self) -> bool:
+        return len(self.index) == 0 and self._response_bytes == 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.index_bytes + self._response_bytes + self._tag_bytes
+
+    def idle_seconds(self) -> float:
+        return time.time() - self.last_used
+
+    def get_response(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._responses.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    self._pop_response(key)
+                self.stats["response_misses"] += 1
+                return None
+            self._responses.move_to_end(key)
+            self.stats["response_hits"] += 1
+            return entry[1]
+
+    def put_response(self, key: str, value: Any) -> None:
+        size = len(key) + len(json.dumps(value, ensure_ascii=False, default=str)) + ENTRY_OVERHEAD_BYTES
+        with self._lock:
+            if key in self._responses:
+                self._pop_response(key)
+            if self.index_bytes + self._tag_bytes + size > self.quota_bytes:
+                return  # The index already fills the quota
+            self._responses[key] = (time.time() + TENANT_RESPONSE_TTL, value, size)
+            self._response_bytes += size
+            self._evict_responses_locked(self.nbytes - self.quota_bytes)
+
+    def tags(self, fetch: Callable[[Dict[str, str]], List[str]]) -> List[str]:
+        """This tenant's tag dictionary, refetched after TENANT_TAGS_TTL.
+
+        fetch(headers) gets the tags from the backend with this tenant's headers.
+        """
+        with self._lock:
+            if self._tags is not None and self._tags[0] >= time.time():
+                self.stats["tag_hits"] += 1
+                return list(self._tags[1])
+            self.stats["tag_misses"] += 1
+
+        tags = fetch({TENANT_HEADER: self.id})
+        with self._lock:
+            self._tags = (time.time() + TENANT_TAGS_TTL, list(tags))
+            self._tag_bytes = sum(len(tag) for tag in tags) + ENTRY_OVERHEAD_BYTES
+        return tags
+
+    def evict_responses(self, nbytes: int) -> int:
+        """Drop least recently used responses until nbytes are freed; returns bytes freed"""
+        with self._lock:
+            return self._evict_responses_locked(nbytes)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            responses = len(self._responses)
+        return {
+            "tasks": len(self.index),
+            "index_bytes": self.index_bytes,
+            "response_bytes": self._response_bytes,
+            "tag_bytes": self._tag_bytes,
+            "nbytes": self.nbytes,
+            "quota_bytes": self.quota_bytes,
+            "max_tasks": self.index.max_tasks,
+            "cached_responses": responses,
+            "idle_seconds": round(self.idle_seconds(), 1),
+            **self.stats,
+        }
+
+    def _pop_response(self, key: str) -> None:
+        _, _, size = self._responses.pop(key)
+        self._response_bytes -= size
+
+    def _evict_responses_locked(self, nbytes: int) -> int:
+        freed = 0
+        while freed < nbytes and self._responses:
+            _, (_, _, size) = self._responses.popitem(last=False)
+            self._response_bytes -= size
+            freed += size
+            self.stats["response_evictions"] += 1
+        return freed
+
+
+class TenantRegistry:
+    """Tenants by key, kept within a tenant cap and a total memory budget.
+
+    At most max_tenants are held. A new tenant beyond that replaces the least
+    recently used tenant that is empty or idle for TENANT_IDLE_SECONDS, and is
+    refused when there is none.
+
+    When the budget is exceeded, only tenants above their fair share
+    (budget / tenants) give memory back: the largest first, cached responses
+    before anything else, then whole indexes of tenants idle for
+    TENANT_IDLE_SECONDS (rebuilt on their next sync). Tenants within their
+    share are never evicted for someone else. Call rebalance() after work
+    that grows a tenant.
+    """
+
+    def __init__(self, quota_bytes: int = int(TENANT_MEMORY_QUOTA_MB * _MB),
+                 budget_bytes: int = int(TENANT_TOTAL_MEMORY_MB * _MB),
+                 max_tenants: int = TENANT_MAX, allowed_ids: frozenset = TENANT_IDS):
+        self.quota_bytes = quota_bytes
+        self.budget_bytes = budget_bytes
+        self.max_tenants = max(max_tenants, 1)
+        self.allowed_ids = allowed_ids
+        self._lock = threading.Lock()
+        self._tenants: "OrderedDict[str, Tenant]" = OrderedDict({
+            DEFAULT_TENANT: Tenant(DEFAULT_TENANT, quota_bytes, task_index),
+        })
+        self.stats = {"tenants_created": 1, "tenants_evicted": 0, "tenants_refused": 0}
+
+    def get(self, tenant_id: Optional[str] = None) -> Tenant:
+        """Tenant for a request key, created on first use.
+
+        Raises ValueError for keys that are not 1-64 letters, digits or _.:-
+        or not in allowed_ids, and RuntimeError when max_tenants are held and
+        none of them can be evicted.
+        """
+        tenant_id = (tenant_id or "").strip() or DEFAULT_TENANT
+        if not _TENANT_ID.match(tenant_id):
+            raise ValueError("Tenant id must be 1-64 characters of letters, digits, '_', '.', ':' or '-'")
+        if self.allowed_ids and tenant_id != DEFAULT_TENANT and tenant_id not in self.allowed_ids:
+            raise ValueError(f"Unknown tenant: {tenant_id}")
+
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is not None:
+                self._tenants.move_to_end(tenant_id)
+                tenant.last_used = time.time()
+                return tenant
+
+            if len(self._tenants) >= self.max_tenants and not self._evict_lru_locked():
+                self.stats["tenants_refused"] += 1
+                raise RuntimeError("Too many active tenants, try again later")
+            tenant = Tenant(tenant_id, self.quota_bytes)
+            self._tenants[tenant_id] = tenant
+            self.stats["tenants_created"] += 1
+
+        self.rebalance(tenant)
+        return tenant
+
+    def _evict_lru_locked(self) -> bool:
+        """Drop the least recently used empty or idle tenant; False when there is none"""
+        for tenant in self._tenants.values():
+            if tenant.id != DEFAULT_TENANT and (tenant.empty or tenant.idle_seconds() >= TENANT_IDLE_SECONDS):
+                del self._tenants[tenant.id]
+                self.stats["tenants_evicted"] += 1
+                return True
+        return False
+
+    def rebalance(self, current: Optional[Tenant] = None) -> None:
+        """Bring total usage back under the budget, taking from the largest tenants first"""
+        with self._lock:
+            tenants = list(self._tenants.values())
+        total = sum(tenant.nbytes for tenant in tenants)
+        if total <= self.budget_bytes:
+            return
+
+        fair_share = self.budget_bytes / len(tenants)
+        by_size = sorted(tenants, key=lambda tenant: tenant.nbytes, reverse=True)
+        for tenant in by_size:
+            if total <= self.budget_bytes or tenant.nbytes <= fair_share:
+                break
+            total -= tenant.evict_responses(min(total - self.budget_bytes, tenant.nbytes - fair_share))
+
+        for tenant in by_size:
+            if total <= self.budget_bytes:
+                break
+            if (tenant is current or tenant.id == DEFAULT_TENANT or tenant.nbytes <= fair_share
+                    or tenant.idle_seconds() < TENANT_IDLE_SECONDS):
+                continue
+            total -= tenant.nbytes
+            with self._lock:
+                if self._tenants.get(tenant.id) is tenant:
+                    del self._tenants[tenant.id]
+                    self.stats["tenants_evicted"] += 1
+            print(f"Tenant {tenant.id} evicted: idle and over its fair share of the memory budget")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            tenants = dict(self._tenants)
+        snapshots = {tenant_id: tenant.snapshot() for tenant_id, tenant in tenants.items()}
+        return {
+            "tenants": snapshots,
+            "total_bytes": sum(s["nbytes"] for s in snapshots.values()),
+            "budget_bytes": self.budget_bytes,
+            "quota_bytes": self.quota_bytes,
+            "max_tenants": self.max_tenants,
+            **self.stats,
+        }
+
+
+tenant_registry = TenantRegistry()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+import os
+import weakref
+import tempfile
+from multiprocessing import shared_memory
+from typing import Optional, Union, Dict, Tuple
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+INDEX_QUANTIZATION = os.getenv("INDEX_QUANTIZATION", "none")  # "none" or "int8"
+INDEX_RESCORE_DIR = os.getenv("INDEX_RESCORE_DIR")  # Keep exact vectors on disk for re-scoring
+INDEX_RESCORE_FACTOR = int(os.getenv("INDEX_RESCORE_FACTOR", "4"))  # Candidates re-scored per result
+SCORE_CHUNK_ROWS = 65536  # Rows dequantized at a time while scoring
+
+Rows = Union[slice, np.ndarray]
+
+
+def _release_segments(segments: list) -> None:
+    for segment in segments:
+        segment.close()
+        segment.unlink()
+    segments.clear()
+
+
+class SharedArrays:
+    """Named numpy arrays, optionally backed by shared memory so worker
+    processes can attach to them without copying (see ai_sharded_scoring)"""
+
+    def __init__(self, shared: bool = False):
+        self.shared = shared
+        self._segments: Dict[str, shared_memory.SharedMemory] = {}
+        self._retired = []  # Replaced segments, released once their data is copied
+        self._owned = []  # Every live segment; unlinked on release_all, collection or exit
+        weakref.finalize(self, _release_segments, self._owned)
+
+    def allocate(self, name: str, shape: Tuple[int, ...], dtype) -> np.ndarray:
+        dtype = np.dtype(dtype)
+        if not self.shared:
+            return np.zeros(shape, dtype=dtype)
+
+        size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+        segment = shared_memory.SharedMemory(create=True, size=size)
+        self._owned.append(segment)
+        array = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+        array[...] = 0
+        if name in self._segments:
+            self._retired.append(self._segments[name])
+        self._segments[name] = segment
+        return array
+
+    def spec(self, arrays: Dict[str, np.ndarray]) -> Dict[str, Tuple[str, Tuple[int, ...], str]]:
+        """Segment name, shape and dtype of each array, for attaching from another process"""
+        return {
+            name: (self._segments[name].name, array.shape, array.dtype.str)
+            for name, array in arrays.items()
+        }
+
+    def release_retired(self) -> None:
+        """Unmap segments replaced by allocate(); call after copying out of them"""
+        for segment in self._retired:
+            self._owned.remove(segment)
+        _release_segments(self._retired)
+
+    def release_all(self) -> None:
+        self._segments.clear()
+        self._retired.clear()
+        _release_segments(self._owned)
+
+
+class FloatVectorStore:
+    """Row-addressable float32 vectors (the exact baseline)"""
+
+    exact = None
+
+    def __init__(self, dim: int, capacity: int = 16, shared: bool = False):
+        self.dim = dim
+        self._arrays = SharedArrays(shared)
+        self._vectors = self._arrays.allocate("_vectors", (capacity, dim), np.float32)
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    @property
+    def nbytes(self) -> int:
+        return self._vectors.nbytes
+
+    @property
+    def row_nbytes(self) -> int:
+        return self.dim * 4
+
+    def resize(self, capacity: int) -> None:
+        old = self._vectors
+        vectors = self._arrays.allocate("_vectors", (capacity, self.dim), np.float32)
+        vectors[:len(old)] = old
+        self._vectors = vectors
+        del old
+        self._arrays.release_retired()
+
+    def shared_spec(self) -> dict:
+        return {"dim": self.dim, "arrays": self._arrays.spec({"_vectors": self._vectors})}
+
+    def close(self) -> None:
+        self._arrays.release_all()
+
+    def set(self, row: int, vector: np.ndarray) -> None:
+        self._vectors[row] = vector
+
+    def get(self, row: int) -> np.ndarray:
+        return self._vectors[row]
+
+    def scores(self, queries: np.ndarray, rows: Rows) -> np.ndarray:
+        """(num_queries, num_rows) inner products"""
+        return queries @ self._vectors[rows].T
+
+
+class Int8VectorStore:
+    """Scalar-quantized vectors: one int8 code per dimension plus a float32 scale per row.
+
+    Scoring is asymmetric: float queries are multiplied with the int8 codes and
+    rescaled per row, so only the stored side loses precision. With a rescore
+    directory the exact float32 vectors are also kept in a disk-backed memmap
+    (page cache, not heap) so top candidates can be re-scored exactly.
+    """
+
+    def __init__(self, dim: int, capacity: int = 16, rescore_dir: Optional[str] = None, shared: bool = False):
+        self.dim = dim
+        self._arrays = SharedArrays(shared)
+        self._codes = self._arrays.allocate("_codes", (capacity, dim), np.int8)
+        self._scales = self._arrays.allocate("_scales", capacity, np.float32)
+        self._exact_file = None
+        self.exact = None
+        if rescore_dir:
+            os.makedirs(rescore_dir, exist_ok=True)
+            self._exact_file = tempfile.NamedTemporaryFile(dir=rescore_dir, suffix=".f32", delete=True)
+            self._map_exact(capacity)
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    @property
+    def nbytes(self) -> int:
+        """In-memory footprint (the exact memmap lives on disk)"""
+        return self._codes.nbytes + self._scales.nbytes
+
+    @property
+    def row_nbytes(self) -> int:
+        return self.dim + 4
+
+    def resize(self, capacity: int) -> None:
+        old_codes, old_scales = self._codes, self._scales
+        codes = self._arrays.allocate("_codes", (capacity, self.dim), np.int8)
+        codes[:len(old_codes)] = old_codes
+        scales = self._arrays.allocate("_scales", capacity, np.float32)
+        scales[:len(old_scales)] = old_scales
+        self._codes, self._scales = codes, scales
+        del old_codes, old_scales
+        self._arrays.release_retired()
+        if self._exact_file is not None:
+            self._map_exact(capacity)
+
+    def shared_spec(self) -> dict:
+        return {"dim": self.dim, "arrays": self._arrays.spec({"_codes": self._codes, "_scales": self._scales})}
+
+    def close(self) -> None:
+        self._arrays.release_all()
+        if self._exact_file is not None:
+            self.exact = None
+            self._exact_file.close()
+            self._exact_file = None
+
+    def set(self, row: int, vector: np.ndarray) -> None:
+        vector = np.asarray(vector, dtype=np.float32)
+        scale = float(np.abs(vector).max()) / 127.0
+        if scale == 0.0:
+            scale = 1.0
+        self._codes[row] = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        self._scales[row] = scale
+        if self.exact is not None:
+            self.exact[row] = vector
+
+    def get(self, row: int) -> np.ndarray:
+        if self.exact is not None:
+            return np.array(self.exact[row])
+        return self._codes[row].astype(np.float32) * self._scales[row]
+
+    def scores(self, queries: np.ndarray, rows: Rows) -> np.ndarray:
+        """(num_queries, num_rows) asymmetric inner products, dequantizing in chunks"""
+        if isinstance(rows, slice):
+            start, stop = rows.start or 0, rows.stop
+            chunks = [slice(s, min(s + SCORE_CHUNK_ROWS, stop)) for s in range(start, stop, SCORE_CHUNK_ROWS)]
+        else:
+            chunks = [rows[s:s + SCORE_CHUNK_ROWS] for s in range(0, len(rows), SCORE_CHUNK_ROWS)]
+
+        if not chunks:
+            return np.zeros((len(queries), 0), dtype=np.float32)
+
+        return np.concatenate([
+            (queries @ self._codes[chunk].T.astype(np.float32)) * self._scales[chunk]
+            for chunk in chunks
+        ], axis=1)
+
+    def _map_exact(self, capacity: int) -> None:
+        old = self.exact
+        if old is not None:
+            old.flush()
+        self._exact_file.truncate(capacity * self.dim * 4)
+        self.exact = np.memmap(self._exact_file.name, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+
+def candidate_depth(store, k: int, num_rows: int, rescore_factor: int = 1) -> int:
+    """How many approximate candidates to keep per query before the final top-k"""
+    if store.exact is not None and rescore_factor > 1:
+        return min(num_rows, k * rescore_factor)
+    return min(num_rows, k)
+
+
+def top_candidates(scores: np.ndarray, depth: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Unordered per-row top-depth columns of a score matrix and their scores"""
+    candidates = np.argpartition(-scores, depth - 1, axis=1)[:, :depth]
+    return candidates, np.take_along_axis(scores, candidates, axis=1)
+
+
+def finish_ranking(store, queries: np.ndarray, rows: np.ndarray, candidates: np.ndarray,
+                   candidate_scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Re-score surplus candidates exactly when possible, then order and cut to k"""
+    if candidates.shape[1] > k and store.exact is not None:
+        candidate_scores = np.einsum("qd,qcd->qc", queries, store.exact[rows[candidates]])
+
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+
+def rank(store, queries: np.ndarray, rows: np.ndarray, k: int, rescore_factor: int = 1):
+    """Per-query top-k over the given rows for a whole batch of queries.
+
+    Returns (positions into rows, scores), both shaped (num_queries, k). When the
+    store keeps exact vectors, the top k * rescore_factor approximate candidates
+    are re-scored exactly before the final ranking.
+    """
+    depth = candidate_depth(store, k, len(rows), rescore_factor)
+    candidates, candidate_scores = top_candidates(store.scores(queries, rows), depth)
+    return finish_ranking(store, queries, rows, candidates, candidate_scores, k)
+
+
+def make_vector_store(dim: int, capacity: int = 16, quantization: str = INDEX_QUANTIZATION, shared: bool = False):
+    if quantization == "int8":
+        return Int8VectorStore(dim, capacity, rescore_dir=INDEX_RESCORE_DIR, shared=shared)
+    if quantization == "none":
+        return FloatVectorStore(dim, capacity, shared=shared)
+    raise ValueError(f"Unknown index quantization: {quantization}")
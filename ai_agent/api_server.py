@@ -1,16 +1,54 @@
 #!/usr/bin/env python3
-from fastapi import FastAPI, HTTPException
+import time
+import json
+import asyncio
+from datetime import date
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 import uvicorn
 from ai_new_task import parse_task_with_ai
-from ai_tag_suggest import suggest_tags_with_ai
+from ai_tag_suggest import suggest_tags_with_ai, fetch_existing_tags
 from ai_summary import generate_summary
+from ai_task_stats import compute_task_stats
 from ai_similar_tasks import find_similar_tasks
-from ai_semantic_search import semantic_search
+from ai_semantic_search import semantic_search, batch_semantic_search
+from ai_prompt_cache import prompt_token_stats
+from ai_jobs import job_manager
+from ai_search_stream import SearchSession, search_stream_stats
+from ai_tenants import TENANT_HEADER, ADMIN_TOKEN_HEADER, Tenant, tenant_registry, response_key, is_admin
+from ai_profiling import (
+    PROFILE_HEADER, should_profile, start_profile, finish_profile, current_profile, call_profiled, mark_endpoint
+)
+
+
+class ProfiledRoute(APIRoute):
+    """Reports request parsing/validation and response serialization of profiled
+    requests as their own Server-Timing stages"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, mark_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def profiled_handler(request: Request):
+            profile = current_profile()
+            if profile is None:
+                return await handler(request)
+            start = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                profile.add_route(start, time.perf_counter())
+
+        return profiled_handler
+
 
 app = FastAPI(title="AI Task Parser API", version="1.0.0")
+app.router.route_class = ProfiledRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,9 +56,31 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
 
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """Opt-in stage timings (Server-Timing) and cProfile dumps for slow requests"""
+    if not should_profile(request.headers.get(PROFILE_HEADER)):
+        return await call_next(request)
+
+    start = time.perf_counter()
+    profile = start_profile()
+    try:
+        response = await call_next(request)
+    finally:
+        total_ms = (time.perf_counter() - start) * 1000
+        dump_path = finish_profile(profile, total_ms, f"{request.method} {request.url.path}")
+        if dump_path:
+            print(f"Slow request profiled: {request.method} {request.url.path} {total_ms:.0f} ms -> {dump_path}")
+
+    response.headers["Server-Timing"] = profile.server_timing(total_ms)
+    response.headers["Timing-Allow-Origin"] = "*"
+    return response
+
+
 class ParseTaskRequest(BaseModel):
     input: str
 
@@ -60,9 +120,21 @@ class GenerateSummaryResponse(BaseModel):
     error: Optional[str] = None
 
 
+class TaskStatsRequest(BaseModel):
+    tasks: List[Dict[str, Any]]
+    period: Optional[str] = "daily"  # "daily" or "weekly"
+
+
+class TaskStatsResponse(BaseModel):
+    success: bool
+    stats: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
 class FindSimilarTasksRequest(BaseModel):
-    target_task: Dict[str, Any]
-    all_tasks: List[Dict[str, Any]]
+    task_id: Optional[int] = None
+    target_task: Optional[Dict[str, Any]] = None
+    all_tasks: Optional[List[Dict[str, Any]]] = None
 
 
 class SimilarTask(BaseModel):
@@ -76,9 +148,21 @@ class FindSimilarTasksResponse(BaseModel):
     error: Optional[str] = None
 
 
+class IndexTasksRequest(BaseModel):
+    tasks: List[Dict[str, Any]]
+
+
+class IndexTasksResponse(BaseModel):
+    success: bool
+    indexed: Optional[List[int]] = None
+    total: Optional[int] = None
+    error: Optional[str] = None
+
+
 class SemanticSearchRequest(BaseModel):
     query: str
     tasks: List[Dict[str, Any]]
+    top_k: Optional[int] = Field(None, ge=1)  # Stop generating once this many results are ranked
 
 
 class SearchResult(BaseModel):
@@ -92,37 +176,135 @@ class SemanticSearchResponse(BaseModel):
     error: Optional[str] = None
 
 
+class BatchSemanticSearchRequest(BaseModel):
+    queries: List[str]
+    tasks: List[Dict[str, Any]]
+    top_k: Optional[int] = 10
+
+
+class QueryResults(BaseModel):
+    query: str
+    results: List[SearchResult]
+
+
+class BatchSemanticSearchResponse(BaseModel):
+    success: bool
+    results: Optional[List[QueryResults]] = None
+    error: Optional[str] = None
+
+
+class SubmitJobRequest(BaseModel):
+    type: str  # "summary", "similarity" or "search"
+    payload: Dict[str, Any]
+
+
+class JobStatus(BaseModel):
+    id: str
+    type: str
+    status: str  # "queued", "running", "succeeded" or "failed"
+    progress: float
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: float
+    finished_at: Optional[float] = None
+
+
+class JobResponse(BaseModel):
+    success: bool
+    job: Optional[JobStatus] = None
+    error: Optional[str] = None
+
+
+MAX_JOB_WAIT_SECONDS = 60
+
+
+def current_tenant(request: Request) -> Tenant:
+    """Tenant named by the X-Tenant-Id header; the default tenant when absent"""
+    try:
+        return tenant_registry.get(request.headers.get(TENANT_HEADER))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run upstream or index work off the event loop, so one tenant's slow call or
+    reindex doesn't hold up everyone else's cache hits. Profiled requests are
+    cProfiled in that worker thread, so profiling doesn't change how they run."""
+    return await asyncio.to_thread(call_profiled, func, *args, **kwargs)
+
+
+async def cached_call(tenant: Tenant, key: str, func, *args):
+    """func(*args) from the tenant's response cache, calling it on a miss"""
+    value = tenant.get_response(key)
+    if value is None:
+        value = await run_blocking(func, *args)
+        tenant.put_response(key, value)
+        tenant_registry.rebalance(tenant)
+    return value
+
+
 @app.get("/")
 async def root():
     return {"service": "AI Task Parser API", "status": "running"}
 
 
+@app.get("/api/prompt-cache-stats")
+async def prompt_cache_stats():
+    return {"success": True, "features": prompt_token_stats.snapshot()}
+
+
+@app.get("/api/tenant-stats")
+async def tenant_stats(request: Request, tenant: Tenant = Depends(current_tenant)):
+    """The caller's tenant; every tenant with a valid X-Admin-Token"""
+    admin_token = request.headers.get(ADMIN_TOKEN_HEADER)
+    if admin_token is not None:
+        if not is_admin(admin_token):
+            raise HTTPException(status_code=403, detail="Invalid admin token")
+        return {"success": True, **tenant_registry.snapshot()}
+    return {"success": True, "tenant": tenant.id, **tenant.snapshot()}
+
+
+@app.get("/api/search-stream-stats")
+async def search_stream_statistics():
+    return {"success": True, "stats": search_stream_stats.snapshot()}
+
+
 @app.post("/api/parse-task", response_model=ParseTaskResponse)
-async def parse_task(request: ParseTaskRequest):
+async def parse_task(request: ParseTaskRequest, tenant: Tenant = Depends(current_tenant)):
     if not request.input or not request.input.strip():
         raise HTTPException(status_code=400, detail="Input cannot be empty")
 
     try:
-        task_obj = parse_task_with_ai(request.input.strip())
+        text = request.input.strip()
+        # Relative dates resolve against today, so the date is part of the key
+        key = response_key("parse_task", text, date.today().isoformat())
+        task_obj = await cached_call(tenant, key, parse_task_with_ai, text)
         return ParseTaskResponse(success=True, data=TaskObject(**task_obj))
     except Exception as e:
         return ParseTaskResponse(success=False, error=str(e))
 
 
 @app.post("/api/suggest-tags", response_model=SuggestTagsResponse)
-async def suggest_tags(request: SuggestTagsRequest):
+async def suggest_tags(request: SuggestTagsRequest, tenant: Tenant = Depends(current_tenant)):
     if not request.title or not request.title.strip():
         raise HTTPException(status_code=400, detail="Title cannot be empty")
 
     try:
-        tags = suggest_tags_with_ai(request.title.strip(), request.description)
+        title = request.title.strip()
+        # The tag dictionary is part of the prompt, so a new tag invalidates cached suggestions
+        existing_tags = await run_blocking(tenant.tags, fetch_existing_tags)
+        key = response_key("suggest_tags", title, request.description, existing_tags)
+        tags = await cached_call(tenant, key, suggest_tags_with_ai, title, request.description,
+                                 lambda: existing_tags)
         return SuggestTagsResponse(success=True, tags=tags)
     except Exception as e:
         return SuggestTagsResponse(success=False, error=str(e))
 
 
 @app.post("/api/generate-summary", response_model=GenerateSummaryResponse)
-async def generate_task_summary(request: GenerateSummaryRequest):
+async def generate_task_summary(request: GenerateSummaryRequest, tenant: Tenant = Depends(current_tenant)):
     if not isinstance(request.tasks, list):
         raise HTTPException(status_code=400, detail="Tasks must be a list")
 
@@ -130,22 +312,65 @@ async def generate_task_summary(request: GenerateSummaryRequest):
         raise HTTPException(status_code=400, detail="Period must be 'daily' or 'weekly'")
 
     try:
-        summary = generate_summary(request.tasks, request.period)
+        # Task stats are computed per calendar day, so the date fully keys the summary
+        key = response_key("summary", request.period, date.today().isoformat(), request.tasks)
+        summary = await cached_call(tenant, key, generate_summary, request.tasks, request.period)
         return GenerateSummaryResponse(success=True, summary=summary)
     except Exception as e:
         return GenerateSummaryResponse(success=False, error=str(e))
 
 
+@app.post("/api/task-stats", response_model=TaskStatsResponse)
+async def task_stats(request: TaskStatsRequest):
+    if request.period not in ["daily", "weekly"]:
+        raise HTTPException(status_code=400, detail="Period must be 'daily' or 'weekly'")
+
+    try:
+        stats = compute_task_stats(request.tasks, request.period)
+        return TaskStatsResponse(success=True, stats=stats)
+    except Exception as e:
+        return TaskStatsResponse(success=False, error=str(e))
+
+
 @app.post("/api/find-similar-tasks", response_model=FindSimilarTasksResponse)
-async def find_similar(request: FindSimilarTasksRequest):
-    if not isinstance(request.target_task, dict):
-        raise HTTPException(status_code=400, detail="Target task must be a dict")
-    
-    if not isinstance(request.all_tasks, list):
-        raise HTTPException(status_code=400, detail="All tasks must be a list")
+async def find_similar(request: FindSimilarTasksRequest, tenant: Tenant = Depends(current_tenant)):
+    task_id = request.task_id
+    if task_id is None and request.target_task is not None:
+        task_id = request.target_task.get("id")
+
+    if task_id is None and request.target_task is None:
+        raise HTTPException(status_code=400, detail="Either task_id or target_task is required")
+
+    # Answer by id from the neighbour graph, which /api/task-index keeps current as
+    # tasks are created, edited and deleted
+    if task_id is not None:
+        index = tenant.index
+
+        def lookup():
+            similar = index.similar(int(task_id))
+            if similar is None and request.all_tasks is not None:
+                # Not indexed yet (e.g. the agent restarted): index the tasks once, then answer
+                index.sync(request.all_tasks + ([request.target_task] if request.target_task else []))
+                similar = index.similar(int(task_id))
+            return similar
+
+        try:
+            similar = await run_blocking(lookup)
+            tenant_registry.rebalance(tenant)
+            if similar is not None:
+                return FindSimilarTasksResponse(
+                    success=True,
+                    similar_tasks=[SimilarTask(**task) for task in similar]
+                )
+        except Exception as e:
+            print(f"Warning: Task index lookup failed, falling back to AI: {str(e)}")
+
+    if request.target_task is None or request.all_tasks is None:
+        raise HTTPException(status_code=404, detail="Task is not indexed")
 
     try:
-        similar = find_similar_tasks(request.target_task, request.all_tasks)
+        key = response_key("similar_tasks", request.target_task, request.all_tasks)
+        similar = await cached_call(tenant, key, find_similar_tasks, request.target_task, request.all_tasks)
         return FindSimilarTasksResponse(
             success=True, 
             similar_tasks=[SimilarTask(**task) for task in similar]
@@ -154,8 +379,24 @@ async def find_similar(request: FindSimilarTasksRequest):
         return FindSimilarTasksResponse(success=False, error=str(e))
 
 
+@app.post("/api/task-index", response_model=IndexTasksResponse)
+async def index_tasks(request: IndexTasksRequest, tenant: Tenant = Depends(current_tenant)):
+    try:
+        indexed = await run_blocking(tenant.index.sync, request.tasks)
+        tenant_registry.rebalance(tenant)
+        return IndexTasksResponse(success=True, indexed=indexed, total=len(tenant.index))
+    except Exception as e:
+        return IndexTasksResponse(success=False, error=str(e))
+
+
+@app.delete("/api/task-index/{task_id}", response_model=IndexTasksResponse)
+async def remove_indexed_task(task_id: int, tenant: Tenant = Depends(current_tenant)):
+    removed = await run_blocking(tenant.index.remove, task_id)
+    return IndexTasksResponse(success=True, indexed=[task_id] if removed else [], total=len(tenant.index))
+
+
 @app.post("/api/semantic-search", response_model=SemanticSearchResponse)
-async def search_tasks(request: SemanticSearchRequest):
+async def search_tasks(request: SemanticSearchRequest, tenant: Tenant = Depends(current_tenant)):
     if not request.query or not request.query.strip():
         raise HTTPException(status_code=400, detail="Query cannot be empty")
     
@@ -163,7 +404,9 @@ async def search_tasks(request: SemanticSearchRequest):
         raise HTTPException(status_code=400, detail="Tasks must be a list")
 
     try:
-        results = semantic_search(request.query.strip(), request.tasks)
+        query = request.query.strip()
+        key = response_key("semantic_search", query, request.top_k, request.tasks)
+        results = await cached_call(tenant, key, semantic_search, query, request.tasks, request.top_k)
         return SemanticSearchResponse(
             success=True,
             results=[SearchResult(**r) for r in results]
@@ -172,6 +415,90 @@ async def search_tasks(request: SemanticSearchRequest):
         return SemanticSearchResponse(success=False, error=str(e))
 
 
+@app.post("/api/semantic-search/batch", response_model=BatchSemanticSearchResponse)
+async def batch_search_tasks(request: BatchSemanticSearchRequest, tenant: Tenant = Depends(current_tenant)):
+    queries = [(q or "").strip() for q in request.queries]
+    searched = [q for q in queries if q]
+    if not searched:
+        raise HTTPException(status_code=400, detail="Queries cannot be empty")
+
+    if request.top_k is None or request.top_k < 1:
+        raise HTTPException(status_code=400, detail="top_k must be positive")
+
+    try:
+        results = iter(await run_blocking(batch_semantic_search, searched, request.tasks, request.top_k,
+                                          index=tenant.index))
+        tenant_registry.rebalance(tenant)
+        # One entry per input query, in order; blank queries match nothing
+        return BatchSemanticSearchResponse(
+            success=True,
+            results=[
+                QueryResults(query=query, results=[SearchResult(**r) for r in next(results)] if query else [])
+                for query in queries
+            ]
+        )
+    except Exception as e:
+        return BatchSemanticSearchResponse(success=False, error=str(e))
+
+
+@app.post("/api/jobs", response_model=JobResponse, status_code=202)
+async def submit_job(request: SubmitJobRequest, tenant: Tenant = Depends(current_tenant)):
+    try:
+        job = job_manager.submit(request.type, request.payload, tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    return JobResponse(success=True, job=JobStatus(**job.to_dict()))
+
+
+@app.get("/api/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, wait: float = 0, tenant: Tenant = Depends(current_tenant)):
+    """Job status; with wait > 0, long-poll up to that many seconds for completion"""
+    job = job_manager.get(job_id, tenant)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+
+    # Waits on the event loop, so waiting clients hold no worker thread
+    if wait > 0:
+        await job.wait(min(wait, MAX_JOB_WAIT_SECONDS))
+
+    return JobResponse(success=True, job=JobStatus(**job.to_dict()))
+
+
+@app.websocket("/ws/search")
+async def search_stream(websocket: WebSocket):
+    """Search-as-you-type: send {"type": "tasks"} once, then {"type": "query"} per keystroke.
+
+    Browsers can't set headers on WebSockets, so the tenant may also come from ?tenant=
+    """
+    try:
+        tenant = tenant_registry.get(websocket.headers.get(TENANT_HEADER) or websocket.query_params.get("tenant"))
+    except (ValueError, RuntimeError) as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+
+    await websocket.accept()
+    session = SearchSession(websocket.send_json, tenant.index)
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except json.JSONDecodeError:
+                await websocket.send_json({"type": "error", "error": "Messages must be JSON objects"})
+                continue
+            if not isinstance(message, dict):
+                await websocket.send_json({"type": "error", "error": "Messages must be JSON objects"})
+                continue
+            await session.handle(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        session.close()
+        tenant_registry.rebalance(tenant)
+
+
 if __name__ == "__main__":
     print("🚀 Starting AI Task Parser API on http://localhost:8001")
     print("📍 API docs: http://localhost:8001/docs")
@@ -179,6 +506,12 @@ if __name__ == "__main__":
     print("   - POST /api/parse-task: Parse natural language to task")
     print("   - POST /api/suggest-tags: AI tag suggestions")
     print("   - POST /api/generate-summary: Generate task summary (daily/weekly)")
+    print("   - POST /api/task-stats: Task statistics (status/priority, overdue, workload)")
     print("   - POST /api/find-similar-tasks: Find similar tasks")
+    print("   - POST/DELETE /api/task-index: Maintain the similar-task graph")
     print("   - POST /api/semantic-search: Semantic search tasks")
+    print("   - POST /api/semantic-search/batch: Batch semantic search (many queries, one task set)")
+    print("   - WS /ws/search: Search-as-you-type (debounced, superseded queries cancelled)")
+    print("   - POST /api/jobs, GET /api/jobs/{id}?wait=: Async summary/similarity/search jobs")
+    print("   - GET /api/tenant-stats: Caller's cache/index memory, quota, hits and evictions (all tenants with X-Admin-Token)")
     uvicorn.run(app, host="0.0.0.0", port=8001, log_level="info")
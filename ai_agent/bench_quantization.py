@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Recall vs memory benchmark: int8 task index against the float32 baseline.
+
+Uses synthetic clustered unit vectors (no API calls). Ground truth is the exact
+float32 top-5; recall@5 is the fraction of it recovered by each configuration.
+"""
+import sys
+import time
+import tempfile
+import numpy as np
+from ai_vector_store import FloatVectorStore, Int8VectorStore, rank
+
+
+def make_corpus(n: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def fill(store, vectors: np.ndarray):
+    for row, vector in enumerate(vectors):
+        store.set(row, vector)
+    return store
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 512
+    num_queries, k = 200, 5
+
+    vectors = make_corpus(n, dim, clusters=max(n // 50, 1))
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, n, num_queries)] + 0.3 * rng.normal(size=(num_queries, dim)).astype(np.float32)
+    queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+    rows = np.arange(n)
+
+    baseline = fill(FloatVectorStore(dim, n), vectors)
+    truth, _ = rank(baseline, queries, rows, k)
+
+    with tempfile.TemporaryDirectory() as rescore_dir:
+        configs = [
+            ("float32", baseline, 1),
+            ("int8", fill(Int8VectorStore(dim, n), vectors), 1),
+            ("int8 + rescore x4", fill(Int8VectorStore(dim, n, rescore_dir=rescore_dir), vectors), 4),
+        ]
+
+        print(f"{n} vectors x {dim} dims, {num_queries} queries, recall@{k}")
+        print(f"{'config':<20}{'memory MB':>12}{'ratio':>8}{'recall':>9}{'ms/query':>10}")
+        for name, store, rescore_factor in configs:
+            start = time.perf_counter()
+            found, _ = rank(store, queries, rows, k, rescore_factor)
+            elapsed_ms = (time.perf_counter() - start) * 1000 / num_queries
+            print(f"{name:<20}{store.nbytes / 2**20:>12.1f}{baseline.nbytes / store.nbytes:>7.1f}x"
+                  f"{recall_at_k(found, truth):>9.3f}{elapsed_ms:>10.2f}")
+
+        # Release the rescore memmap before its directory is removed
+        del configs, store
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Throughput of sharded multi-process scoring vs a single process.
+
+Fills a shared-memory vector store with synthetic unit vectors (no API calls),
+then measures queries/second for in-process ranking and for ShardedScorer with
+1, 2, 4, ... workers up to the CPU count, checking results match the baseline.
+Also times one full score row, the per-task cost of a neighbour graph update.
+
+Speedups only mean something on a machine with several physical cores.
+"""
+import os
+import sys
+import time
+import numpy as np
+from ai_vector_store import FloatVectorStore, rank
+from ai_sharded_scoring import ShardedScorer
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    batch, batches, k = 32, 5, 5
+
+    rng = np.random.default_rng(0)
+    store = FloatVectorStore(dim, n, shared=True)
+    for start in range(0, n, 100000):
+        chunk = rng.normal(size=(min(100000, n - start), dim)).astype(np.float32)
+        store._vectors[start:start + len(chunk)] = chunk / np.linalg.norm(chunk, axis=1, keepdims=True)
+    rows = np.arange(n)
+    queries = [store._vectors[rng.integers(0, n, batch)] for _ in range(batches)]
+
+    def measure(ranker):
+        ranker(queries[0])  # Warm up caches and worker attachments
+        start = time.perf_counter()
+        results = [ranker(q)[0] for q in queries]
+        return batch * batches / (time.perf_counter() - start), results
+
+    def graph_row_ms(scorer=None):
+        query = store._vectors[:1]
+        score = (lambda: scorer.scores(store, query, slice(0, n))) if scorer else (lambda: store.scores(query, slice(0, n)))
+        score()
+        start = time.perf_counter()
+        for _ in range(batches):
+            score()
+        return (time.perf_counter() - start) * 1000 / batches
+
+    baseline_qps, expected = measure(lambda q: rank(store, q, rows, k))
+    baseline_row_ms = graph_row_ms()
+    print(f"{n} vectors x {dim} dims, batches of {batch} queries, top-{k}")
+    print(f"{'mode':<14}{'queries/s':>12}{'speedup':>10}{'matches':>9}{'graph row ms':>14}{'speedup':>10}")
+    print(f"{'in-process':<14}{baseline_qps:>12.1f}{1.0:>9.2f}x{'yes':>9}{baseline_row_ms:>14.1f}{1.0:>9.2f}x")
+
+    cpus = os.cpu_count() or 1
+    workers = 1
+    while workers <= cpus:
+        scorer = ShardedScorer(workers)
+        scorer.warm_up()
+        qps, results = measure(lambda q: scorer.rank(store, q, rows, k))
+        row_ms = graph_row_ms(scorer)
+        matches = all(np.array_equal(np.sort(a, axis=1), np.sort(b, axis=1)) for a, b in zip(results, expected))
+        print(f"{f'{workers} workers':<14}{qps:>12.1f}{qps / baseline_qps:>9.2f}x{'yes' if matches else 'NO':>9}"
+              f"{row_ms:>14.1f}{baseline_row_ms / row_ms:>9.2f}x")
+        scorer.shutdown()
+        workers *= 2
+
+    if cpus < 2:
+        print("Only one CPU available: this run shows per-call overhead, not scaling")
+
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Modules are flat scripts in ai_agent/; they create API clients at import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DASHSCOPE_API_KEY", "test-key")
@@ -0,0 +1,67 @@
+import json
+import os
+
+import pytest
+
+import ai_eval
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_corpus.jsonl")
+
+
+@pytest.fixture
+def records():
+    with open(CORPUS, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_offline_report_covers_every_kind(records):
+    report = ai_eval.evaluate(records)
+
+    assert set(report) == set(ai_eval.KINDS)
+    for kind, engines in report.items():
+        assert engines["llm (recorded)"]["errors"] == 0
+        # The recorded reference always agrees with itself
+        assert all(value == 1.0 for metric, value in engines["llm (recorded)"].items()
+                   if metric in ("accuracy", "exact", f"precision@{ai_eval.EVAL_K}", f"recall@{ai_eval.EVAL_K}"))
+    assert report["parse_task"]["rules"]["calls"] == 3
+    assert "embedding" not in report["find_similar"]
+
+
+def test_errored_runs_score_as_misses(records, monkeypatch):
+    def flaky(inp):
+        if inp["query"] == "login problems":
+            raise RuntimeError("engine failed")
+        return ai_eval.bm25_search(inp)
+
+    monkeypatch.setitem(ai_eval.ENGINES["semantic_search"], "bm25", (flaky, False))
+    stats = ai_eval.evaluate(records)["semantic_search"]["bm25"]
+
+    assert stats["calls"] == 2
+    assert stats["errors"] == 1
+    # One perfect case and one miss, not the mean of the surviving case alone
+    assert stats[f"recall@{ai_eval.EVAL_K}"] == 0.5
+    assert stats[f"precision@{ai_eval.EVAL_K}"] == 0.5
+
+
+def test_bm25_similar_cutoff_is_absolute():
+    target = {"id": 1, "title": "Plan weekend hiking trip", "tags": []}
+    weak = {"id": 2, "title": "Plan the team offsite", "tags": []}
+    unrelated = {"id": 3, "title": "Buy groceries", "tags": []}
+
+    # The best candidate is a weak match; dividing by the best score would call it 1.0
+    ranked = ai_eval.bm25_similar_scores(target, [target, weak, unrelated])
+    assert [task["id"] for task, _ in ranked] == [2, 3]
+    assert ranked[0][1] < ai_eval.BM25_SIMILAR_MIN_SCORE
+    assert ai_eval.bm25_similar({"target_task": target, "all_tasks": [target, weak, unrelated]}) == []
+
+    duplicate = {"id": 4, "title": "Plan weekend hiking trip", "tags": []}
+    results = ai_eval.bm25_similar({"target_task": target, "all_tasks": [target, weak, duplicate]})
+    assert [r["task_id"] for r in results] == [4]
+
+
+def test_calibrate_bm25_offline(records):
+    calibrated = ai_eval.calibrate_similar_threshold(records, engine="bm25")
+
+    assert calibrated["cases"] == 3
+    assert calibrated["f1"] == 1.0
+    assert 0.0 < calibrated["threshold"] < 0.5
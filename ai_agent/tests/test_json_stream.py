@@ -0,0 +1,158 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from ai_json_stream import StreamingJSONParser, read_stream, stream_items
+from ai_prompt_cache import prompt_token_stats
+from ai_semantic_search import _validate_item
+
+
+def feed_all(parser, text, size=3):
+    """Feed text in small chunks, returning every item reported by feed()"""
+    items = []
+    for i in range(0, len(text), size):
+        items.extend(parser.feed(text[i:i + size]))
+    return items
+
+
+class FakeStream:
+    """Streamed chat completion yielding one chunk per piece of text"""
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        for piece in self.pieces:
+            self.read += 1
+            delta = SimpleNamespace(content=piece)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+
+    def close(self):
+        self.closed = True
+
+
+def test_fenced_and_prefixed_output():
+    text = 'Here are the tags:\n```json\n{"tags": ["work", "urgent"]}\n```\nDone.'
+    parser = StreamingJSONParser("tags")
+    assert feed_all(parser, text) == ["work", "urgent"]
+    assert parser.complete
+    assert parser.result() == {"tags": ["work", "urgent"]}
+    assert not parser.salvaged
+
+
+@pytest.mark.parametrize("prefix", [
+    "Here are the results [ranked]: ",
+    "Results {see below}:\n```json\n",
+    "Note [the list is short] and {\"quoted\" prose}: ",
+])
+def test_brackets_in_prose_are_skipped(prefix):
+    value = {"results": [{"task_id": 1, "score": 0.9}]}
+    for size in (1, 3, 50):
+        parser = StreamingJSONParser("results")
+        assert feed_all(parser, prefix + json.dumps(value) + "\n```", size=size) == value["results"]
+        assert parser.complete
+        assert parser.result() == value
+        assert parser.result_items() == value["results"]
+
+
+def test_strings_with_brackets_and_escaped_quotes():
+    items = [{"id": 1, "reason": 'has } and ] and \\"quotes\\"'}, {"id": 2, "reason": "[{"}]
+    text = json.dumps({"results": items})
+    parser = StreamingJSONParser("results")
+    assert feed_all(parser, text, size=1) == items
+    assert parser.result() == {"results": items}
+
+
+def test_items_key_after_other_keys_and_nested_arrays():
+    value = {
+        "meta": {"results": [99], "ids": [[1, 2], [3]]},
+        "other": [{"results": [0]}],
+        "results": [{"id": 1, "tags": ["a", "b"]}, 2, "three", None, True],
+        "after": [4],
+    }
+    parser = StreamingJSONParser("results")
+    assert feed_all(parser, json.dumps(value)) == value["results"]
+    assert parser.result() == value
+
+
+def test_truncated_output_is_salvaged():
+    text = '{"results": [{"id": 1, "score": 0.9}, {"id": 2, "score": 0.8}, {"id": 3, "sco'
+    parser = StreamingJSONParser("results")
+    assert feed_all(parser, text) == [{"id": 1, "score": 0.9}, {"id": 2, "score": 0.8}]
+    assert not parser.complete
+    assert parser.result() == {"results": [{"id": 1, "score": 0.9}, {"id": 2, "score": 0.8}]}
+    assert parser.salvaged
+
+
+def test_truncated_output_without_items_raises():
+    parser = StreamingJSONParser("results")
+    parser.feed('{"summary": "unfinished')
+    with pytest.raises(json.JSONDecodeError):
+        parser.result()
+    assert not parser.salvaged
+
+
+def test_root_array():
+    parser = StreamingJSONParser("results")
+    assert feed_all(parser, '[{"id": 1}, {"id": 2}]') == [{"id": 1}, {"id": 2}]
+    assert parser.result() == [{"id": 1}, {"id": 2}]
+
+    assert parser.result_items() == [{"id": 1}, {"id": 2}]
+
+    truncated = StreamingJSONParser("results")
+    truncated.feed('[{"id": 1}, {"id"')
+    assert truncated.result() == [{"id": 1}]
+    assert truncated.result_items() == [{"id": 1}]
+    assert truncated.salvaged
+
+
+def test_without_items_key():
+    parser = StreamingJSONParser()
+    assert feed_all(parser, 'Sure! {"title": "a}b", "priority": "high"} trailing') == []
+    assert parser.result() == {"title": "a}b", "priority": "high"}
+
+
+def test_stream_stops_at_limit():
+    pieces = ['{"results": [', '{"id": 1}, ', '{"id": 2}, ', '{"id": 3}, ', '{"id": 4}', ']}']
+    stream = FakeStream(pieces)
+    parser = StreamingJSONParser("results")
+    items = list(stream_items(stream, parser, "test", limit=2))
+    assert items == [{"id": 1}, {"id": 2}]
+    assert stream.closed
+    assert stream.read == 3
+    assert parser.result() == {"results": [{"id": 1}, {"id": 2}]}
+    assert parser.salvaged
+
+
+def test_read_stream_limit_counts_accepted_items():
+    pieces = ['[{"id": 1}, ', '{"id": 2}, ', '{"id": 3}, ', '{"id": 4}, ', '{"id": 5}, ', '{"id": 6}]']
+    stream = FakeStream(pieces)
+    parser = read_stream(stream, StreamingJSONParser("results"), "test", limit=2,
+                         accept=lambda item: item["id"] % 2 == 0)
+    assert parser.items == [{"id": 1}, {"id": 2}, {"id": 3}, {"id": 4}]
+    assert stream.closed and stream.read == 4
+
+    stream = FakeStream(pieces)
+    parser = read_stream(stream, StreamingJSONParser("results"), "test")
+    assert parser.result() == [{"id": i} for i in range(1, 7)]
+    assert stream.closed and stream.read == 6
+
+
+def test_early_stop_counts_unknown_usage():
+    before = prompt_token_stats.snapshot().get("test_usage", {})
+    stream = FakeStream(['[{"id": 1}, ', '{"id": 2}]'])
+    list(stream_items(stream, StreamingJSONParser("results"), "test_usage", limit=1))
+    after = prompt_token_stats.snapshot()["test_usage"]
+    assert after["calls"] == before.get("calls", 0) + 1
+    assert after["calls_without_usage"] == before.get("calls_without_usage", 0) + 1
+
+
+def test_non_numeric_scores_are_skipped_mid_stream():
+    pieces = ['{"results": [{"task_id": 1, "score": "high"}, ', '{"task_id": "x", "score": 0.9}, ',
+              '{"task_id": 3, "score": null}, ', '{"task_id": 4, "score": 0.8}]}']
+    items = list(stream_items(FakeStream(pieces), StreamingJSONParser("results"), "test",
+                              accept=lambda item: _validate_item(item) is not None))
+    assert items == [{"task_id": 4, "score": 0.8}]
@@ -0,0 +1,204 @@
+import asyncio
+import gc
+
+import numpy as np
+import pytest
+
+import ai_search_stream
+from ai_search_stream import SearchSession
+
+
+@pytest.mark.parametrize("message, error", [
+    ({"type": "query", "seq": "abc", "query": "x"}, "seq must be an integer"),
+    ({"type": "query", "seq": True, "query": "x"}, "seq must be an integer"),
+    ({"type": "query", "query": 5}, "query must be a string"),
+    ({"type": "tasks", "tasks": "x"}, "tasks must be a list of objects"),
+    ({"type": "tasks", "tasks": [1, 2]}, "tasks must be a list of objects"),
+    ({"type": "tasks", "tasks": [{"id": "a"}]}, "task ids must be integers"),
+    ({"type": "nope"}, "Unknown message type: nope"),
+])
+def test_malformed_messages_get_error_reply(message, error):
+    sent = []
+
+    async def send(reply):
+        sent.append(reply)
+
+    async def run():
+        session = SearchSession(send)
+        try:
+            await session.handle(message)
+            # The session is still usable afterwards
+            await session.handle({"type": "query", "query": "", "seq": 7})
+            await asyncio.sleep(0)
+        finally:
+            session.close()
+
+    asyncio.run(run())
+    assert sent[0] == {"type": "error", "error": error}
+    assert sent[1]["seq"] == 7 and sent[1]["results"] == []
+
+
+TASKS = [{"id": 1, "title": "Write report"}, {"id": 2, "title": "Fix login bug"}]
+
+
+class FakeIndex:
+    def __init__(self, fail_sync=False):
+        self.fail_sync = fail_sync
+        self.searched_ids = []
+
+    def sync(self, tasks):
+        if self.fail_sync:
+            raise RuntimeError("sync failed")
+
+    def search(self, query_vectors, task_ids, top_k, min_score):
+        self.searched_ids.append(list(task_ids))
+        return [[{"task_id": task_id, "score": 0.5} for task_id in task_ids]]
+
+
+class FakeUpstream:
+    """Embedding and LLM calls that wait until a query is released (instant by default)"""
+
+    def __init__(self, monkeypatch):
+        self.gates = {}
+        self.calls = []       # (kind, query) for every call started
+        self.cancelled = []   # (kind, query) for every call cancelled mid-flight
+        self.llm_tasks = []   # Task set each LLM call ranked
+        monkeypatch.setattr(ai_search_stream, "embed_texts_async", self.embed)
+        monkeypatch.setattr(ai_search_stream, "iter_semantic_search_async", self.rank)
+
+    def hold(self, query):
+        self.gates[query] = asyncio.Event()
+
+    async def _wait(self, kind, query):
+        self.calls.append((kind, query))
+        try:
+            if query in self.gates:
+                await self.gates[query].wait()
+            await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            self.cancelled.append((kind, query))
+            raise
+
+    async def embed(self, texts):
+        await self._wait("embed", texts[0])
+        return np.ones((1, 4), dtype=np.float32)
+
+    async def rank(self, query, tasks, top_k=None):
+        self.llm_tasks.append([task["id"] for task in tasks])
+        await self._wait("llm", query)
+        for task in tasks:
+            yield {"task_id": task["id"], "score": 0.9}
+
+
+def run_session(scenario, index=None, debounce_ms=20):
+    """Run scenario(session, sent) on a fresh session; returns the messages sent"""
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        session = SearchSession(send, index=index or FakeIndex(), debounce_ms=debounce_ms)
+        try:
+            await scenario(session, sent)
+        finally:
+            session.close()
+
+    asyncio.run(run())
+    return sent
+
+
+async def wait_for_final(sent, seq):
+    for _ in range(500):
+        if any(m.get("seq") == seq and m.get("final") for m in sent):
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"No final results for seq {seq}")
+
+
+def test_debounce_skips_superseded_keystrokes(monkeypatch):
+    upstream = FakeUpstream(monkeypatch)
+    counters = {}
+
+    async def scenario(session, sent):
+        session.set_tasks(TASKS)
+        for seq, query in enumerate(["r", "re", "rep"], start=1):
+            session.submit(query, seq)
+            await asyncio.sleep(0)
+        await wait_for_final(sent, 3)
+        counters.update(session.snapshot())
+
+    sent = run_session(scenario)
+
+    assert upstream.calls == [("embed", "rep"), ("llm", "rep")]
+    assert {m["seq"] for m in sent} == {3}
+    assert counters["queries"] == 3
+    assert counters["debounced"] == 2
+    assert counters["upstream_calls"] == 2
+    assert counters["upstream_completed"] == 2
+    assert counters["wasted_upstream_calls"] == 0
+
+
+def test_newer_query_cancels_in_flight_call(monkeypatch):
+    upstream = FakeUpstream(monkeypatch)
+    upstream.hold("slow")
+    counters = {}
+
+    async def scenario(session, sent):
+        session.set_tasks(TASKS)
+        session.submit("slow", 1)
+        while ("embed", "slow") not in upstream.calls:
+            await asyncio.sleep(0.005)
+        session.submit("fast", 2)
+        await wait_for_final(sent, 2)
+        counters.update(session.snapshot())
+
+    sent = run_session(scenario)
+
+    assert upstream.cancelled == [("embed", "slow")]
+    assert ("llm", "slow") not in upstream.calls
+    assert all(m["seq"] == 2 for m in sent)
+    assert [m["source"] for m in sent][0] == "index"
+    assert counters["debounced"] == 0
+    assert counters["upstream_calls"] == 3
+    assert counters["upstream_cancelled"] == 1
+    assert counters["wasted_upstream_calls"] == 1
+    assert counters["wasted_rate"] == round(1 / 3, 3)
+
+
+def test_query_keeps_its_task_set(monkeypatch):
+    upstream = FakeUpstream(monkeypatch)
+    upstream.hold("report")
+    index = FakeIndex()
+
+    async def scenario(session, sent):
+        session.set_tasks(TASKS)
+        session.submit("report", 1)
+        while ("embed", "report") not in upstream.calls:
+            await asyncio.sleep(0.005)
+        session.set_tasks([{"id": 3, "title": "Buy milk"}])
+        upstream.gates["report"].set()
+        await wait_for_final(sent, 1)
+
+    sent = run_session(scenario, index=index)
+
+    assert index.searched_ids == [[1, 2]]
+    assert upstream.llm_tasks == [[1, 2]]
+    assert [r["task_id"] for r in sent[-1]["results"]] == [1, 2]
+
+
+def test_replaced_failed_sync_is_retrieved(monkeypatch):
+    FakeUpstream(monkeypatch)
+    unhandled = []
+
+    async def scenario(session, sent):
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unhandled.append(context))
+        session.set_tasks(TASKS)
+        await asyncio.sleep(0.05)  # The first sync fails with nothing waiting on it
+        session.set_tasks(TASKS)
+        await asyncio.sleep(0.05)
+        gc.collect()
+        await asyncio.sleep(0)
+
+    run_session(scenario, index=FakeIndex(fail_sync=True))
+    assert unhandled == []
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+import ai_task_index
+from ai_sharded_scoring import ShardedScorer
+from ai_task_index import TaskIndex
+from ai_vector_store import make_vector_store, rank
+from test_task_index import DIM, unit, assert_matches
+
+
+@pytest.fixture(scope="module")
+def scorer():
+    scorer = ShardedScorer(2)
+    scorer.warm_up()
+    yield scorer
+    scorer.shutdown()
+
+
+@pytest.mark.parametrize("quantization", ["none", "int8"])
+def test_sharded_scoring_matches_in_process(scorer, quantization):
+    rng = np.random.default_rng(1)
+    store = make_vector_store(DIM, 64, quantization, shared=True)
+    for size in (500, 3000):  # The second round runs after a resize replaced the segments
+        store.resize(size)
+        for row, vector in enumerate(unit(rng, size)):
+            store.set(row, vector)
+        queries = unit(rng, 4)
+        rows = rng.permutation(size)[:size // 2]
+
+        expected = rank(store, queries, rows, 5)
+        actual = scorer.rank(store, queries, rows, 5)
+        np.testing.assert_array_equal(actual[0], expected[0])
+        np.testing.assert_allclose(actual[1], expected[1], rtol=1e-5)
+
+        np.testing.assert_allclose(scorer.scores(store, queries, slice(10, size)),
+                                   store.scores(queries, slice(10, size)), rtol=1e-5, atol=1e-6)
+    store.close()
+
+
+def test_sharded_graph_matches_brute_force(scorer, monkeypatch):
+    monkeypatch.setattr(ai_task_index, "INDEX_SHARDS", 2)
+    monkeypatch.setattr(ai_task_index, "INDEX_SHARD_MIN_ROWS", 1)
+    monkeypatch.setattr(ai_task_index, "get_sharded_scorer", lambda: scorer)
+    rng = np.random.default_rng(2)
+    index = TaskIndex(dim=DIM, k=5, min_score=0.1, quantization="none")
+    vectors = {}
+
+    for step in range(300):
+        task_id = int(rng.integers(0, 60))
+        if rng.random() < 0.2 and vectors:
+            index.remove(task_id)
+            vectors.pop(task_id, None)
+        else:
+            vectors[task_id] = unit(rng)[0]
+            index.upsert(task_id, vectors[task_id])
+
+    assert_matches(index, vectors)
+    ids = list(vectors)
+    results = index.search(np.array([vectors[ids[0]]]), top_k=3)
+    assert results[0][0]["task_id"] == ids[0]
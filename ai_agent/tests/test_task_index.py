@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from ai_task_index import TaskIndex
+
+DIM = 16
+
+
+def unit(rng, n=1):
+    vectors = rng.normal(size=(n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def brute_force(vectors, k, min_score):
+    """Expected neighbour lists recomputed from scratch"""
+    ids = list(vectors)
+    matrix = np.array([vectors[i] for i in ids])
+    expected = {}
+    for i, task_id in enumerate(ids):
+        scores = matrix @ matrix[i]
+        scores[i] = -np.inf
+        order = np.argsort(-scores, kind="stable")[:k]
+        expected[task_id] = [(float(scores[j]), ids[j]) for j in order if scores[j] >= min_score]
+    return expected
+
+
+def assert_matches(index, vectors):
+    expected = brute_force(vectors, index.k, index.min_score)
+    for task_id, neighbours in expected.items():
+        actual = index.similar(task_id)
+        assert [n["task_id"] for n in actual] == [other for _, other in neighbours], task_id
+        assert [n["score"] for n in actual] == pytest.approx([round(s, 2) for s, _ in neighbours], abs=0.011)
+
+
+def test_incremental_graph_matches_brute_force():
+    rng = np.random.default_rng(0)
+    index = TaskIndex(dim=DIM, k=5, min_score=0.1, quantization="none")
+    vectors = {}
+
+    for step in range(3000):
+        op = rng.random()
+        if op < 0.5 or len(vectors) < 10:
+            task_id = int(rng.integers(0, 200))
+            vectors[task_id] = unit(rng)[0]
+            index.upsert(task_id, vectors[task_id])
+        elif op < 0.8:
+            task_id = int(rng.choice(list(vectors)))
+            assert index.remove(task_id)
+            del vectors[task_id]
+        else:
+            # Edit: move an existing task close to another one
+            task_id, near = (int(t) for t in rng.choice(list(vectors), 2, replace=False))
+            vector = vectors[near] + 0.1 * unit(rng)[0]
+            vectors[task_id] = vector / np.linalg.norm(vector)
+            index.upsert(task_id, vectors[task_id])
+
+        if step % 250 == 0:
+            assert_matches(index, vectors)
+
+    assert len(index) == len(vectors)
+    assert_matches(index, vectors)
+
+
+def test_remove_unknown_task():
+    index = TaskIndex(dim=DIM, quantization="none")
+    assert index.remove(42) is False
+    assert index.similar(42) is None
+
+
+def test_similar_refills_when_candidates_exclude_neighbours():
+    rng = np.random.default_rng(1)
+    index = TaskIndex(dim=DIM, k=5, min_score=0.3, quantization="none")
+    base = unit(rng)[0]
+    for task_id in range(1, 9):
+        vector = base + 0.01 * unit(rng)[0]
+        index.upsert(task_id, vector / np.linalg.norm(vector))
+
+    # Tasks 2-4 were deleted upstream but are still indexed
+    similar = index.similar(1, {1, 5, 6, 7, 8})
+    assert sorted(n["task_id"] for n in similar) == [5, 6, 7, 8]
+    assert [n["score"] for n in similar] == sorted((n["score"] for n in similar), reverse=True)
+
+    assert len(index.similar(1, set(range(1, 9)))) == 5
+    assert index.similar(1, {1}) == []
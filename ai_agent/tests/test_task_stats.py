@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from ai_task_stats import compute_task_stats
+
+# A Wednesday afternoon
+NOW = datetime(2026, 10, 21, 15, 30)
+
+
+def task(due_at, status="PENDING", priority="MEDIUM"):
+    return {"title": due_at, "status": status, "priority": priority, "dueAt": due_at}
+
+
+def test_weekly_workload_covers_the_calendar_week():
+    tasks = [
+        task("2026-10-19T10:00:00", status="COMPLETED"),  # Monday, earlier this week
+        task("2026-10-25T18:00:00"),                      # Sunday
+        task("2026-10-26T09:00:00"),                      # Next Monday
+    ]
+    workload = compute_task_stats(tasks, "weekly", now=NOW)["workload"]
+
+    assert [day["date"] for day in workload] == [f"2026-10-{d}" for d in range(19, 26)]
+    assert workload[0] == {"date": "2026-10-19", "due": 1, "completed": 1}
+    assert workload[-1] == {"date": "2026-10-25", "due": 1, "completed": 0}
+
+
+def test_overdue_is_fixed_for_the_day():
+    tasks = [
+        task("2026-10-20T23:00:00"),  # Yesterday
+        task("2026-10-21T09:00:00"),  # Earlier today
+        task("2026-10-21T20:00:00"),  # Later today
+    ]
+    morning = compute_task_stats(tasks, now=NOW.replace(hour=0, minute=5))
+    evening = compute_task_stats(tasks, now=NOW.replace(hour=23))
+
+    for stats in (morning, evening):
+        assert stats["overdue"] == 1
+        assert stats["due_today"] == 2
+        assert [day["date"] for day in stats["workload"]] == ["2026-10-21"]
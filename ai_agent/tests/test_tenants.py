@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import ai_tenants
+from ai_task_index import TaskIndex, GRAPH_BYTES_PER_TASK
+from ai_tenants import DEFAULT_TENANT, Tenant, TenantRegistry
+
+DIM = 16
+MB = 1024 * 1024
+
+
+def small_index():
+    return TaskIndex(dim=DIM, quantization="none")
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(ai_tenants, "TaskIndex", small_index)
+    return TenantRegistry(quota_bytes=MB, budget_bytes=64 * MB, max_tenants=3)
+
+
+def fill(tenant, n):
+    vectors = np.eye(DIM, dtype=np.float32)
+    for task_id in range(n):
+        tenant.index.upsert(task_id, vectors[task_id % DIM], f"fp{task_id}")
+
+
+def test_index_bytes_counts_allocated_capacity():
+    tenant = Tenant("a", MB, small_index())
+    assert tenant.index_bytes == 16 * DIM * 4  # Preallocated rows, nothing indexed yet
+
+    fill(tenant, 3)
+    assert tenant.index_bytes == 16 * DIM * 4 + 3 * GRAPH_BYTES_PER_TASK
+
+
+def test_capacity_never_grows_past_quota():
+    quota = 40 * (DIM * 4 + GRAPH_BYTES_PER_TASK)
+    tenant = Tenant("a", quota, small_index())
+    assert tenant.index.max_tasks == 40
+
+    fill(tenant, 40)
+    assert tenant.index.nbytes == 40 * DIM * 4  # 16 -> 32 -> 40, not 64
+    assert tenant.nbytes <= quota
+
+
+def test_tenant_cap_evicts_least_recently_used_empty_tenant(registry):
+    a, b = registry.get("a"), registry.get("b")
+    fill(a, 2)
+    registry.get("a")  # Most recently used; b is older but empty
+
+    c = registry.get("c")
+    snapshot = registry.snapshot()
+    assert set(snapshot["tenants"]) == {DEFAULT_TENANT, "a", "c"}
+    assert snapshot["tenants_evicted"] == 1
+    assert registry.get("c") is c and registry.get("a") is a
+
+
+def test_tenant_cap_refuses_when_every_tenant_is_busy(registry, monkeypatch):
+    for tenant_id in ("a", "b"):
+        fill(registry.get(tenant_id), 1)
+
+    with pytest.raises(RuntimeError):
+        registry.get("c")
+    assert registry.snapshot()["tenants_refused"] == 1
+
+    # Once a tenant has been idle long enough it makes room
+    monkeypatch.setattr(ai_tenants, "TENANT_IDLE_SECONDS", 0)
+    registry.get("c")
+    assert "a" not in registry.snapshot()["tenants"]
+
+
+def test_allowed_ids(monkeypatch):
+    monkeypatch.setattr(ai_tenants, "TaskIndex", small_index)
+    registry = TenantRegistry(quota_bytes=MB, allowed_ids=frozenset({"team-a"}))
+    assert registry.get("team-a").id == "team-a"
+    assert registry.get(None).id == DEFAULT_TENANT
+    with pytest.raises(ValueError):
+        registry.get("team-b")
+
+
+def test_tenant_stats_are_scoped_to_the_caller(monkeypatch):
+    import api_server
+
+    monkeypatch.setattr(ai_tenants, "TaskIndex", small_index)
+    monkeypatch.setattr(api_server, "tenant_registry", TenantRegistry(quota_bytes=MB))
+    monkeypatch.setattr(ai_tenants, "TENANT_ADMIN_TOKEN", "secret")
+    client = TestClient(api_server.app)
+    client.get("/api/tenant-stats", headers={"X-Tenant-Id": "other"})
+
+    own = client.get("/api/tenant-stats", headers={"X-Tenant-Id": "mine"}).json()
+    assert own["tenant"] == "mine" and "tenants" not in own
+
+    assert client.get("/api/tenant-stats", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    admin = client.get("/api/tenant-stats", headers={"X-Admin-Token": "secret"}).json()
+    assert set(admin["tenants"]) == {DEFAULT_TENANT, "other", "mine"}
@@ -172,6 +172,34 @@ export interface FindSimilarTasksResponse {
   error?: string;
 }
 
+/**
+ * Add a created or edited task to the AI Agent's similar-task index (best effort)
+ */
+export const syncTaskIndex = async (task: Task): Promise<void> => {
+  try {
+    await fetch(`${AI_AGENT_BASE_URL}/api/task-index`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ tasks: [task] }),
+    });
+  } catch (error) {
+    console.warn('Sync task to AI index failed:', error);
+  }
+};
+
+/**
+ * Remove a deleted task from the AI Agent's similar-task index (best effort)
+ */
+export const removeFromTaskIndex = async (id: number): Promise<void> => {
+  try {
+    await fetch(`${AI_AGENT_BASE_URL}/api/task-index/${id}`, { method: 'DELETE' });
+  } catch (error) {
+    console.warn('Remove task from AI index failed:', error);
+  }
+};
+
 export const findSimilarTasks = async (request: FindSimilarTasksRequest): Promise<SimilarTask[]> => {
   const response = await fetch(`${AI_AGENT_BASE_URL}/api/find-similar-tasks`, {
     method: 'POST',
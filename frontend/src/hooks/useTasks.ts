@@ -1,5 +1,5 @@
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
-import { fetchTasks, fetchTaskById, createTask, updateTask, deleteTask, completeTask, fetchAllTags } from '../api/tasks';
+import { fetchTasks, fetchTaskById, createTask, updateTask, deleteTask, completeTask, fetchAllTags, syncTaskIndex, removeFromTaskIndex } from '../api/tasks';
 import { TaskQueryParams, CreateTaskPayload, UpdateTaskPayload } from '../types';
 import { toast } from 'sonner';
 
@@ -43,7 +43,9 @@ export const useCreateTask = () => {
 
   return useMutation({
     mutationFn: (payload: CreateTaskPayload) => createTask(payload),
-    onSuccess: () => {
+    onSuccess: (task) => {
+      // 同步 AI 相似任务索引
+      syncTaskIndex(task);
       // 刷新任务列表
       queryClient.invalidateQueries({ queryKey: taskKeys.lists() });
       toast.success('Task created successfully');
@@ -77,7 +79,9 @@ export const useUpdateTask = () => {
       
       return { previousTask };
     },
-    onSuccess: (_, { id }) => {
+    onSuccess: (task, { id }) => {
+      // 同步 AI 相似任务索引
+      syncTaskIndex(task);
       // 刷新列表和详情
       queryClient.invalidateQueries({ queryKey: taskKeys.lists() });
       queryClient.invalidateQueries({ queryKey: taskKeys.detail(id) });
@@ -102,7 +106,9 @@ export const useDeleteTask = () => {
 
   return useMutation({
     mutationFn: (id: number) => deleteTask(id),
-    onSuccess: () => {
+    onSuccess: (_data, id) => {
+      // 同步移除 AI 相似任务索引
+      removeFromTaskIndex(id);
       // 刷新任务列表
       queryClient.invalidateQueries({ queryKey: taskKeys.lists() });
       toast.success('Task deleted');